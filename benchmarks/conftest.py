@@ -0,0 +1,107 @@
+"""
+    Fixtures for the benchmark suite.
+
+    Run with ``pytest benchmarks`` (needs the ``benchmark`` extra). Besides the
+    usual pytest-benchmark table, every benchmark reports latency percentiles,
+    peak memory and the serialized payload size of its return value.
+"""
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+from plotly.io.json import to_json_plotly
+
+from dashboard.assets import sample_speeds
+
+METR_LA = {"sensors": 207, "periods": 288 * 7 * 17}
+DISTRICT = {"sensors": 2000, "periods": 288 * 14}
+DISTRICT_GRAPH = {"nodes": 10000, "edges": 30000}
+
+_results = []
+
+
+@pytest.fixture(scope="session")
+def metr_la_speeds():
+    return sample_speeds(periods=METR_LA["periods"], num_sensors=METR_LA["sensors"])
+
+
+@pytest.fixture(scope="session")
+def district_speeds():
+    return sample_speeds(periods=DISTRICT["periods"], num_sensors=DISTRICT["sensors"])
+
+
+def make_locations(num_sensors, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {"lat": 34.1 + rng.normal(0, 0.05, num_sensors),
+         "lon": -118.35 + rng.normal(0, 0.08, num_sensors)},
+        index=pd.RangeIndex(num_sensors, name="sensor"),
+    )
+
+
+def make_elements(nodes, edges, seed=0):
+    """Cytoscape elements in the same shape as ``metr_la_graph``"""
+    rng = np.random.default_rng(seed)
+    endpoints = rng.integers(1, nodes + 1, size=(edges, 2))
+    return (
+        [{"data": {"id": str(i), "label": f"Node {i}"}} for i in range(1, nodes + 1)]
+        + [{"data": {"source": str(s), "target": str(t)}} for s, t in endpoints]
+    )
+
+
+@pytest.fixture(scope="session")
+def district_elements():
+    return make_elements(**DISTRICT_GRAPH)
+
+
+def payload_bytes(result):
+    """Size of ``result`` once serialized the way Dash sends it"""
+    return len(to_json_plotly(result).encode())
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """
+    Benchmark ``func(*args, **kwargs)`` and record p50/p95/p99 latency, peak
+    traced memory of a single call and the payload size of the result
+    """
+
+    def run(func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        info = {"peak_memory_bytes": peak, "payload_bytes": payload_bytes(result)}
+        if benchmark.stats is not None:
+            timings = np.asarray(benchmark.stats.stats.data)
+            for q in (50, 95, 99):
+                info[f"p{q}_ms"] = float(np.percentile(timings, q) * 1e3)
+        benchmark.extra_info.update(info)
+        _results.append((request.node.name, info))
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("dashboard benchmarks")
+    header = f"{'benchmark':<52}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    header += f"{'peak MiB':>10}{'payload KiB':>13}"
+    terminalreporter.write_line(header)
+    for name, info in _results:
+        terminalreporter.write_line(
+            f"{name:<52}"
+            f"{info.get('p50_ms', float('nan')):>10.2f}"
+            f"{info.get('p95_ms', float('nan')):>10.2f}"
+            f"{info.get('p99_ms', float('nan')):>10.2f}"
+            f"{info['peak_memory_bytes'] / 2 ** 20:>10.1f}"
+            f"{info['payload_bytes'] / 2 ** 10:>13.1f}"
+        )
@@ -0,0 +1,46 @@
+import pytest
+
+from dashboard import chart
+from dashboard.datasets import Dataset
+
+from conftest import make_locations
+
+DATASETS = ["metr_la_speeds", "district_speeds"]
+
+
+@pytest.fixture(params=DATASETS)
+def dataset(request):
+    frame = request.getfixturevalue(request.param)
+    locations = make_locations(frame.shape[1])
+    name = f"benchmark-{request.param}"
+    chart.registry.register(Dataset(name, speeds=lambda: frame,
+                                    locations=lambda: locations, elements=list,
+                                    rollups=chart.ROLLUPS))
+    yield chart.registry.get(name)
+    chart.registry.unload(name)
+
+
+def _date_range(dataset):
+    return str(dataset.store.first.date()), str(dataset.store.last.date())
+
+
+@pytest.mark.parametrize("aggregation", ["5min", "1h", "1D"])
+def test_update_chart_all_sensors(measure, dataset, aggregation):
+    measure(chart.update_chart, *_date_range(dataset), aggregation, -1, dataset.name)
+
+
+def test_update_chart_single_sensor(measure, dataset):
+    measure(chart.update_chart, *_date_range(dataset), "1h", 3, dataset.name)
+
+
+def test_update_map_figure_all(measure, dataset):
+    measure(chart.update_map_figure, ["ALL"], dataset.name)
+
+
+def test_update_map_figure_selection(measure, dataset):
+    sensors = list(range(0, len(dataset.store.columns), 10))
+    measure(chart.update_map_figure, sensors, dataset.name)
+
+
+def test_select_dataset(measure, dataset):
+    measure(chart.select_dataset, dataset.name)
@@ -0,0 +1,40 @@
+import pytest
+
+from dashboard.connectors import ReplayConnector
+from dashboard.ingestion import SpeedStore
+
+DATASETS = ["metr_la_speeds", "district_speeds"]
+
+
+@pytest.fixture(params=DATASETS)
+def speeds(request):
+    return request.getfixturevalue(request.param)
+
+
+@pytest.mark.parametrize("batch", [1, 288])
+def test_replay_ingestion(measure, speeds, batch):
+    """Unpaced replay of one day into a store maintaining the rollups"""
+    day = speeds.iloc[:288]
+
+    def replay():
+        connector = ReplayConnector(day, speed=float("inf"), batch=batch)
+        store = connector.make_store(rollups=["1h", "1D"])
+        connector.stream(store)
+        return len(store)
+
+    measure(replay)
+
+
+@pytest.fixture
+def store(speeds):
+    return SpeedStore.from_frame(speeds, rollups=["1h", "1D"])
+
+
+def test_store_frame_week(measure, store, speeds):
+    start = speeds.index[0]
+    measure(lambda: store.frame(start, start + 7 * speeds.index.freq * 288).shape)
+
+
+@pytest.mark.parametrize("freq", ["1h", "3h"])
+def test_store_resample_all(measure, store, freq):
+    measure(lambda: store.resample(freq).shape)
@@ -0,0 +1,72 @@
+import pytest
+
+from dashboard.assets import metr_la_network
+from dashboard.datasets import nearest_neighbour_graph
+from dashboard.graph import CompactGraph
+from dashboard.session import SessionState
+
+from conftest import DISTRICT_GRAPH, make_locations
+
+
+@pytest.fixture(scope="module")
+def district_index(district_elements):
+    return CompactGraph.from_elements(district_elements)
+
+
+def _selection(elements, step):
+    nodes = [ele["data"]["id"] for ele in elements if "source" not in ele["data"]]
+    return nodes[::step]
+
+
+def _edit(index, action, ids):
+    state = SessionState(len(index))
+    return getattr(state.graph, action)(index, ids, state.graph.digest(index))
+
+
+def test_element_index(benchmark, district_elements):
+    benchmark(CompactGraph.from_elements, district_elements)
+
+
+def test_load_and_send_graph(measure, district_elements):
+    # The full list is memoized per graph: time a cold one
+    measure(lambda: CompactGraph.from_elements(district_elements).to_elements())
+
+
+def test_nearest_neighbour_graph(benchmark):
+    benchmark(nearest_neighbour_graph, make_locations(DISTRICT_GRAPH["nodes"]))
+
+
+def test_remove_selected_nodes(measure, district_index, district_elements):
+    measure(_edit, district_index, "remove", _selection(district_elements, 10))
+
+
+def test_select_nodes(measure, district_index, district_elements):
+    measure(_edit, district_index, "keep", _selection(district_elements, 2))
+
+
+def test_reset_after_select(measure, district_index, district_elements):
+    state = SessionState(len(district_index))
+    state.graph.keep(district_index, _selection(district_elements, 2), None)
+    hidden = state.graph.shown.copy()
+    version = state.graph.digest(district_index)
+
+    def reset():
+        state.graph.shown[:] = hidden
+        return state.graph.reset(district_index, version)
+
+    measure(reset)
+
+
+def test_reset_button(measure):
+    # What the reset button does after an edit of the bundled network
+    graph = CompactGraph.from_elements(metr_la_network)
+    state = SessionState(len(graph))
+    state.graph.remove(graph, _selection(metr_la_network, 5), None)
+    hidden = state.graph.shown.copy()
+    version = state.graph.digest(graph)
+
+    def reset():
+        state.graph.shown[:] = hidden
+        return state.graph.reset(graph, version)
+
+    measure(reset)
@@ -0,0 +1,248 @@
+"""
+Admission control for expensive callbacks.
+
+When many operators open the dashboard at once they fire the same initial
+callbacks with the same arguments. :class:`SingleFlight` lets concurrent
+identical calls share one computation: the first caller computes, the others
+wait for its result.
+
+:class:`AdmissionQueue` bounds how many callbacks of a worker compute at
+once. Waiting callbacks are admitted by priority: :data:`INTERACTIVE` ones
+(map, heatmap placement) before :data:`QUERY` ones (range queries), and
+slots are reserved for interactive callbacks so that range queries cannot
+take all of them. Once the queue is full or a callback has waited too long
+it is shed. :meth:`Admission.guard` then answers with the last result for the
+same arguments, or with a degraded result, rather than letting the request
+time out.
+"""
+
+import functools
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from dash.exceptions import PreventUpdate
+
+from dashboard.instrumentation import record_cache
+
+_logger = logging.getLogger(__name__)
+
+#: Priority of cheap callbacks the operator waits on
+INTERACTIVE = 0
+#: Priority of expensive range queries
+QUERY = 1
+
+
+class Overloaded(Exception):
+    """The worker cannot admit a callback in time"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one computation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Result of ``func(*args, **kwargs)``, computed once for all callers
+        asking for ``key`` at the same time. Exceptions are raised in every
+        caller.
+
+        Returns:
+          tuple: the result and whether it was shared with an earlier caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = func(*args, **kwargs)
+            except BaseException as error:
+                call.error = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AdmissionQueue:
+    """
+    Bounded number of concurrent callbacks, admitted by priority
+
+    Args:
+      slots (int): callbacks computing at once
+      max_waiting (int): callbacks waiting for a slot before new ones are shed
+      timeout (float): seconds a callback waits for a slot before it is shed
+      reserved (int): slots only :data:`INTERACTIVE` callbacks can take
+    """
+
+    def __init__(self, slots=4, max_waiting=32, timeout=5.0, reserved=1):
+        if not 0 <= reserved < slots:
+            raise ValueError("reserved must leave at least one slot")
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.reserved = reserved
+        self._free = slots
+        self._waiting = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def waiting(self):
+        with self._condition:
+            return len(self._waiting)
+
+    @property
+    def running(self):
+        with self._condition:
+            return self.slots - self._free
+
+    def _can_run(self, priority):
+        return self._free > (self.reserved if priority > INTERACTIVE else 0)
+
+    @contextmanager
+    def admit(self, priority=QUERY):
+        """
+        Hold a slot for the duration of the ``with`` block, lower
+        ``priority`` values first. Raises :class:`Overloaded` when shed.
+        """
+        with self._condition:
+            if not self._waiting and self._can_run(priority):
+                self._free -= 1
+            else:
+                if len(self._waiting) >= self.max_waiting:
+                    raise Overloaded(f"{len(self._waiting)} callbacks waiting")
+                entry = (priority, next(self._order))
+                heapq.heappush(self._waiting, entry)
+                deadline = time.monotonic() + self.timeout
+                while not (self._waiting[0] == entry and self._can_run(priority)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiting.remove(entry)
+                        heapq.heapify(self._waiting)
+                        self._condition.notify_all()
+                        raise Overloaded(f"no slot within {self.timeout} s")
+                    self._condition.wait(remaining)
+                heapq.heappop(self._waiting)
+                self._free -= 1
+                # The next waiter may be able to run too
+                self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._free += 1
+                self._condition.notify_all()
+
+
+def call_key(name, args, kwargs):
+    """Key of a callback call: its name and JSON arguments"""
+    return json.dumps([name, args, kwargs], sort_keys=True, default=str)
+
+
+class Admission:
+    """
+    Coalescing, admission and shedding for the callbacks of a worker
+
+    Args:
+      queue (AdmissionQueue): bounds the concurrent callbacks
+      maxsize (int): results remembered per guarded function for shedding
+    """
+
+    def __init__(self, queue=None, maxsize=32):
+        self.queue = queue or AdmissionQueue()
+        self.maxsize = maxsize
+        self.flights = SingleFlight()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def guard(self, priority=QUERY, fallback=None):
+        """
+        Decorator coalescing identical concurrent calls of a function and
+        admitting them through :attr:`queue`. Arguments must be JSON
+        serializable, so leave per-session arguments out of the function.
+
+        A shed call returns the last result for the same arguments, else
+        ``fallback(*args, **kwargs)`` (a cheaper, degraded result), else
+        raises :class:`~dash.exceptions.PreventUpdate` so the view keeps what
+        it shows.
+        """
+
+        def decorator(func):
+            last = OrderedDict()
+            last_lock = threading.Lock()
+
+            def compute(key, args, kwargs):
+                try:
+                    with self.queue.admit(priority):
+                        result = func(*args, **kwargs)
+                except Overloaded as error:
+                    return shed(key, args, kwargs, error)
+                self._count("admitted")
+                with last_lock:
+                    last[key] = result
+                    last.move_to_end(key)
+                    while len(last) > self.maxsize:
+                        last.popitem(last=False)
+                return result
+
+            def shed(key, args, kwargs, error):
+                with last_lock:
+                    cached = last.get(key)
+                answer = ("a cached result" if cached is not None else
+                          "a degraded result" if fallback is not None else "no update")
+                _logger.warning("Shed %s (%s), answering with %s", func.__name__, error,
+                                answer)
+                if cached is not None:
+                    self._count("cached")
+                    return cached
+                if fallback is not None:
+                    self._count("degraded")
+                    return fallback(*args, **kwargs)
+                self._count("shed")
+                raise PreventUpdate
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = call_key(func.__name__, args, kwargs)
+                result, shared = self.flights.do(key, compute, key, args, kwargs)
+                record_cache(shared, cache="coalesce")
+                if shared:
+                    self._count("coalesced")
+                return result
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,176 @@
+"""
+Spatio-temporal playback of the speed matrix.
+
+The server encodes the frames of a date range once: one ``uint8`` speed bucket
+per sensor per time step, so a day of METR-LA is 288 x 207 bytes.
+:meth:`FrameCache.manifest` describes the frames and the color of every
+bucket, and the route added by :func:`register_animation` serves the frames in
+chunks of raw bytes. The browser downloads the chunks ahead of the playhead
+and colors the map and the graph with clientside callbacks
+(``assets/animation.js``), so playing never calls back to the server.
+"""
+
+import math
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+import flask
+import numpy as np
+
+from dashboard.ingestion import day_range
+from dashboard.instrumentation import record_cache
+
+# Bucket of a missing reading
+MISSING = 255
+
+Frames = namedtuple("Frames", "times buckets")
+
+
+def encode_speeds(values, vmax=70.0, buckets=64):
+    """
+    Speeds as ``uint8`` buckets of ``vmax / buckets`` mph, :data:`MISSING`
+    where there is no reading
+    """
+    values = np.asarray(values, dtype=np.float32)
+    with np.errstate(invalid="ignore"):
+        encoded = np.floor(np.clip(values, 0, vmax) * (buckets / vmax))
+    encoded = np.minimum(encoded, buckets - 1)
+    return np.where(np.isnan(values), MISSING, encoded).astype(np.uint8)
+
+
+# Color of a missing reading
+MISSING_COLOR = "rgb(160,160,160)"
+
+
+def bucket_colors(buckets=64, colorscale="RdYlGn"):
+    """CSS color of every speed bucket, indexed by bucket value"""
+    from plotly.colors import sample_colorscale
+
+    return sample_colorscale(colorscale, list(np.linspace(0, 1, buckets)))
+
+
+class FrameCache:
+    """
+    Encoded frames per date range. Ranges overlapping rows appended to the
+    store are dropped and encoded again on the next request.
+
+    Args:
+      store (SpeedStore): speeds to animate
+      freq (str): time step between frames
+      vmax (float): speed at the top of the color scale
+      buckets (int): number of speed buckets, at most 255
+      chunk_frames (int): frames per download
+      max_frames (int): longest range that is served
+      maxsize (int): number of ranges kept
+    """
+
+    def __init__(self, store, freq="5min", vmax=70.0, buckets=64, chunk_frames=96,
+                 max_frames=288 * 31, maxsize=16):
+        if not 0 < buckets < MISSING:
+            raise ValueError(f"buckets must be between 1 and {MISSING - 1}")
+        self.store = store
+        self.freq = freq
+        self.vmax = vmax
+        self.buckets = buckets
+        self.chunk_frames = chunk_frames
+        self.max_frames = max_frames
+        self.maxsize = maxsize
+        self.colors = bucket_colors(buckets)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        store.subscribe(self._appended)
+
+    def _appended(self, version, first, last):
+        with self._lock:
+            for key in [k for k in self._cache if k[1] is None or k[1] >= first]:
+                del self._cache[key]
+
+    @property
+    def nbytes(self):
+        """Memory held by the encoded ranges"""
+        with self._lock:
+            return sum(f.buckets.nbytes + f.times.nbytes for f in self._cache.values())
+
+    def clear(self):
+        """Drop every encoded range"""
+        with self._lock:
+            self._cache.clear()
+
+    def frames(self, start=None, end=None):
+        """:class:`Frames` between ``start`` and ``end`` (inclusive)"""
+        key = day_range(start, end)
+        with self._lock:
+            frames = self._cache.get(key)
+            if frames is not None:
+                self._cache.move_to_end(key)
+        record_cache(frames is not None, cache="animation")
+        if frames is not None:
+            return frames
+
+        speeds = self.store.resample(self.freq, *key)
+        if len(speeds) > self.max_frames:
+            raise ValueError(
+                f"{len(speeds)} frames exceed the limit of {self.max_frames}")
+        frames = Frames(speeds.index, np.ascontiguousarray(
+            encode_speeds(speeds.to_numpy(), self.vmax, self.buckets)))
+        with self._lock:
+            self._cache[key] = frames
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return frames
+
+    def manifest(self, start=None, end=None, url="/animation"):
+        """
+        What the client needs to play a range: frame timing, chunking and
+        the colors of the speed buckets and of :data:`MISSING`. Chunks are
+        fetched from ``{url}/{chunk}?{query}``.
+        """
+        frames = self.frames(start, end)
+        count, sensors = frames.buckets.shape
+        return {
+            "url": url,
+            "query": urlencode({"start": start or "", "end": end or ""}),
+            "start": int(frames.times[0].value // 10**6) if count else None,
+            "step_ms": int(frames.times.freq.nanos // 10**6) if count else None,
+            "frames": count,
+            "sensors": sensors,
+            "chunk_frames": self.chunk_frames,
+            "chunks": math.ceil(count / self.chunk_frames),
+            "colors": self.colors,
+            "missing": MISSING_COLOR,
+        }
+
+    def chunk(self, start, end, index):
+        """Raw bytes of chunk ``index``, frame after frame, one byte per sensor"""
+        buckets = self.frames(start, end).buckets
+        if not 0 <= index < math.ceil(len(buckets) / self.chunk_frames):
+            raise IndexError(index)
+        lo = index * self.chunk_frames
+        return buckets[lo:lo + self.chunk_frames].tobytes()
+
+
+def register_animation(server, cache, route="/animation"):
+    """
+    Serve the frame chunks of ``cache`` on ``{route}/<chunk>``
+
+    Args:
+      server (flask.Flask): usually ``app.server``
+      cache: the :class:`FrameCache`, or a callable returning the cache of
+        the ``dataset`` query parameter
+    """
+
+    def chunk(index):
+        args = flask.request.args
+        try:
+            frames = cache(args.get("dataset")) if callable(cache) else cache
+            data = frames.chunk(args.get("start") or None, args.get("end") or None,
+                                index)
+        except (IndexError, KeyError):
+            flask.abort(404)
+        except ValueError as ex:
+            flask.abort(400, description=str(ex))
+        return flask.Response(data, mimetype="application/octet-stream")
+
+    server.add_url_rule(f"{route}/<int:index>", "animation_chunk", chunk)
+    return chunk
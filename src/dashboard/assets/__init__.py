@@ -1 +1,3 @@
-from .metr_la_graph import default_elements as metr_la_network
\ No newline at end of file
+from .metr_la_graph import default_elements as metr_la_network
+from .metr_la_sensors import num_sensors, sample_speeds, sensor_locations
+from . import pems_bay_sensors
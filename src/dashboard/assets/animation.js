@@ -0,0 +1,119 @@
+/*
+ * Clientside playback of the encoded speed frames (see dashboard/animation.py).
+ *
+ * Chunks of frames are fetched as raw bytes, one uint8 speed bucket per sensor
+ * per frame, and kept per manifest. Advancing the playhead and coloring the
+ * map and the graph happen in the browser only.
+ */
+(function () {
+    // Bucket of a missing reading, dashboard.animation.MISSING
+    var MISSING = 255;
+    var chunks = {};
+    var noUpdate = function () {
+        return window.dash_clientside.no_update;
+    };
+
+    function chunkUrl(manifest, index) {
+        return manifest.url + "/" + index + "?" + manifest.query;
+    }
+
+    // Bytes of chunk ``index``, or null while it is downloading
+    function load(manifest, index) {
+        if (index < 0 || index >= manifest.chunks) {
+            return null;
+        }
+        var url = chunkUrl(manifest, index);
+        if (!(url in chunks)) {
+            chunks[url] = null;
+            fetch(url)
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.arrayBuffer();
+                })
+                .then(function (buffer) {
+                    chunks[url] = new Uint8Array(buffer);
+                })
+                .catch(function () {
+                    delete chunks[url];
+                });
+        }
+        return chunks[url];
+    }
+
+    // Buckets of every sensor at ``frame``, null while not downloaded
+    function frameBuckets(manifest, frame) {
+        var index = Math.floor(frame / manifest.chunk_frames);
+        var data = load(manifest, index);
+        // Keep the next chunk downloading ahead of the playhead
+        load(manifest, index + 1);
+        if (!data) {
+            return null;
+        }
+        var offset = (frame - index * manifest.chunk_frames) * manifest.sensors;
+        return data.subarray(offset, offset + manifest.sensors);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        animation: {
+            // Start and pause playback
+            toggle: function (clicks, disabled) {
+                var playing = disabled === true;
+                return [!playing, playing ? "Pause" : "Play"];
+            },
+
+            // Move the playhead one frame, waiting while its chunk downloads
+            step: function (n_intervals, frame, manifest) {
+                if (!manifest || !manifest.frames) {
+                    return noUpdate();
+                }
+                var next = (frame + 1) % manifest.frames;
+                return frameBuckets(manifest, next) ? next : noUpdate();
+            },
+
+            // Color the map markers and graph nodes by the speeds at ``frame``
+            render: function (frame, manifest, figure) {
+                if (!manifest || !manifest.frames || !figure) {
+                    return [noUpdate(), noUpdate(), noUpdate()];
+                }
+                var buckets = frameBuckets(manifest, frame);
+                if (!buckets) {
+                    return [noUpdate(), noUpdate(), noUpdate()];
+                }
+                var color = function (bucket) {
+                    return bucket === MISSING ? manifest.missing : manifest.colors[bucket];
+                };
+
+                var data = figure.data.map(function (trace) {
+                    if (!trace.customdata) {
+                        return trace;
+                    }
+                    var marker = Object.assign({}, trace.marker, {
+                        color: trace.customdata.map(function (sensor) {
+                            return color(buckets[sensor]);
+                        }),
+                        colorscale: null,
+                        showscale: false,
+                    });
+                    return Object.assign({}, trace, {marker: marker});
+                });
+
+                var styles = [{selector: "node", style: {label: "data(label)"}}];
+                Object.keys(manifest.nodes || {}).forEach(function (id) {
+                    styles.push({
+                        selector: 'node[id = "' + id + '"]',
+                        style: {"background-color": color(buckets[manifest.nodes[id]])},
+                    });
+                });
+
+                var time = new Date(manifest.start + frame * manifest.step_ms);
+                return [
+                    Object.assign({}, figure, {data: data}),
+                    styles,
+                    time.toISOString().slice(0, 16).replace("T", " "),
+                ];
+            },
+        },
+    });
+})();
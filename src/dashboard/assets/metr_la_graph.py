@@ -1,12 +1,16 @@
 import random
 
+# Seeded: every worker process must build the same graph, sessions shared
+# between workers refer to its element positions
+rng = random.Random(20)
+
 nodes = [{"data": {"id": str(i), "label": f"Node {i}"}} for i in range(1, 21)]
 
 edges = [
     {
         "data": {
-            "source": str(random.randint(1, 20)),
-            "target": str(random.randint(1, 20)),
+            "source": str(rng.randint(1, 20)),
+            "target": str(rng.randint(1, 20)),
         }
     }
     for _ in range(30)
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+num_sensors = 207
+
+_rng = np.random.default_rng(num_sensors)
+
+# Synthetic sensor positions scattered around the Los Angeles freeway network
+sensor_locations = pd.DataFrame(
+    {
+        "lat": 34.10 + _rng.normal(0, 0.05, num_sensors),
+        "lon": -118.35 + _rng.normal(0, 0.08, num_sensors),
+    },
+    index=pd.RangeIndex(num_sensors, name="sensor"),
+)
+
+
+def sample_speeds(start="2012-03-01", periods=288 * 14, freq="5min",
+                  num_sensors=num_sensors, seed=1):
+    """
+    Synthetic speed matrix (mph) shaped like METR-LA: one row per time step,
+    one column per sensor, with morning and evening rush hour dips.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq)
+    hours = (index.hour + index.minute / 60).to_numpy()[:, None]
+    severity = rng.uniform(0.2, 0.6, num_sensors)[None, :]
+    rush = (np.exp(-((hours - 8) ** 2) / 2) + np.exp(-((hours - 17.5) ** 2) / 3))
+    speeds = 65 * (1 - severity * rush) + rng.normal(0, 2, (periods, num_sensors))
+    return pd.DataFrame(np.clip(speeds, 0, 70).astype(np.float32),
+                        index=index, columns=pd.RangeIndex(num_sensors))
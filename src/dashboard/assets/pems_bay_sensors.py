@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from .metr_la_sensors import sample_speeds as _sample_speeds
+
+num_sensors = 325
+
+_rng = np.random.default_rng(num_sensors)
+
+# Synthetic sensor positions scattered around the San Jose freeway network
+sensor_locations = pd.DataFrame(
+    {
+        "lat": 37.33 + _rng.normal(0, 0.06, num_sensors),
+        "lon": -121.92 + _rng.normal(0, 0.07, num_sensors),
+    },
+    index=pd.RangeIndex(num_sensors, name="sensor"),
+)
+
+
+def sample_speeds(start="2017-01-01", periods=288 * 14, freq="5min",
+                  num_sensors=num_sensors, seed=2):
+    """
+    Synthetic speed matrix (mph) shaped like PEMS-BAY, see
+    :func:`dashboard.assets.metr_la_sensors.sample_speeds`
+    """
+    return _sample_speeds(start, periods, freq, num_sensors, seed)
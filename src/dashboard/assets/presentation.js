@@ -0,0 +1,48 @@
+/*
+ * Presentation-only callbacks run in the browser (see dashboard/clientside.py).
+ *
+ * Every function mirrors the Python function of the same name in
+ * dashboard/chart.py, which stays the reference implementation.
+ */
+(function () {
+    // Python's str() of a JSON value, as in "{}".format(value)
+    function pythonStr(value) {
+        if (value === null || value === undefined) {
+            return "None";
+        }
+        if (value === true || value === false) {
+            return value ? "True" : "False";
+        }
+        return String(value);
+    }
+
+    // json.dumps(data, indent=2)
+    function dumps(data) {
+        return data === undefined ? "null" : JSON.stringify(data, null, 2);
+    }
+
+    // Same as app.get_relative_path
+    function relativePath(path) {
+        var config = JSON.parse(document.getElementById("_dash-config").textContent);
+        var prefix = config.requests_pathname_prefix || "/";
+        return prefix.replace(/\/$/, "") + path;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        presentation: {
+            update_output_text: function (start_date, end_date) {
+                return "Selected range: " + pythonStr(start_date) + " - " + pythonStr(end_date);
+            },
+
+            update_export_links: function (session_key) {
+                var url = relativePath("/export") + "?session=" + pythonStr(session_key);
+                return [url + "&format=csv", url + "&format=parquet"];
+            },
+
+            displayTapNodeData: dumps,
+            displayTapEdgeData: dumps,
+            displaySelectedNodeData: dumps,
+            displaySelectedEdgeData: dumps,
+        },
+    });
+})();
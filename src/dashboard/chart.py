@@ -1,7 +1,6 @@
 import os
 import json
 import dash
-import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 import dash_cytoscape as cyto
@@ -11,8 +10,23 @@ import plotly.express as px
 from dotenv import load_dotenv
 from dash import dcc, ctx
 from dash import html
-
-from dashboard.assets import metr_la_network
+from dash import ClientsideFunction
+
+from dashboard.admission import INTERACTIVE, QUERY, Admission, AdmissionQueue
+from dashboard.animation import FrameCache, register_animation
+from dashboard.assets import (metr_la_network, pems_bay_sensors, sample_speeds,
+                              sensor_locations)
+from dashboard.clientside import presentation
+from dashboard.connectors import ReplayConnector
+from dashboard.datasets import Dataset, DatasetRegistry, datasets_from_config
+from dashboard.events import (DATA_VERSION, GRAPH_EDIT, Debouncer, announce_appends,
+                              bus_from_env)
+from dashboard.forecasting import ForecastService, HistoricalAverageForecaster
+from dashboard.export import register_export
+from dashboard.heatmap import TILE, TilePyramid, corridor_order, register_heatmap
+from dashboard.ingestion import day_range
+from dashboard.instrumentation import SamplingProfiler, instrument
+from dashboard.session import GraphState, SessionState, store_from_env
 from dashboard.styles import styles
 
 load_dotenv()
@@ -23,10 +37,161 @@ mapbox_access_token = os.getenv("mapbox_access_token")
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 
-# Read sample data
-np.random.seed(1)
-df = pd.DataFrame(np.random.randn(100, 1), columns=['data'], 
-                  index=pd.date_range('2020-01-01', periods=100))
+# Time every callback and serve the numbers on /metrics. Setting
+# DASHBOARD_PROFILE_DIR also dumps sampled stacks of slow callbacks there.
+profile_dir = os.getenv("DASHBOARD_PROFILE_DIR")
+metrics = instrument(
+    app,
+    profiler=SamplingProfiler(
+        profile_dir, threshold=float(os.getenv("DASHBOARD_PROFILE_THRESHOLD", "1.0"))
+    ) if profile_dir else None,
+)
+
+# Identical concurrent callbacks share one computation. At most
+# DASHBOARD_ADMISSION_SLOTS callbacks compute at once, interactive ones
+# first; callbacks that would wait longer than DASHBOARD_ADMISSION_TIMEOUT
+# seconds, or behind DASHBOARD_ADMISSION_QUEUE others, get a cached or
+# degraded answer.
+admission = Admission(AdmissionQueue(
+    slots=int(os.getenv("DASHBOARD_ADMISSION_SLOTS", "4")),
+    max_waiting=int(os.getenv("DASHBOARD_ADMISSION_QUEUE", "32")),
+    timeout=float(os.getenv("DASHBOARD_ADMISSION_TIMEOUT", "5")),
+))
+
+# Aggregation windows kept up to date during ingestion
+ROLLUPS = ['1h', '1D']
+
+# Events shared with the other workers and ingestion processes of the host
+# through DASHBOARD_EVENT_DIR: ingested data and graph edits
+bus = bus_from_env()
+
+# Heatmap tiles are cached per dataset in DASHBOARD_TILE_DIR (by default a
+# temporary directory, removed when the dataset is evicted)
+tile_dir = os.getenv("DASHBOARD_TILE_DIR")
+
+
+def setup_dataset(dataset):
+    """
+    Attach the views of a dataset when it is loaded
+    """
+    store = dataset.store
+    # Forecasts are computed in the background for all sensors at once;
+    # callbacks only read the cached result
+    forecast = ForecastService(HistoricalAverageForecaster(),
+                               source=lambda: store.tail(288 * 8))
+    if len(store):
+        forecast.refresh()
+    forecast.start()
+    dataset.add('forecast', forecast, close=forecast.stop)
+    # Encoded 5 minute frames for playback, downloaded by the browser in chunks
+    dataset.add('frames', FrameCache(store))
+    # Sensor by time heatmap tiles with sensors ordered along corridors,
+    # starting on the first day of the data, of the archive for a replay
+    pyramid = TilePyramid(
+        store, directory=os.path.join(tile_dir, dataset.name) if tile_dir else None,
+        order=corridor_order(dataset.locations), origin=dataset.time_range[0])
+    dataset.add('pyramid', pyramid, close=pyramid.close)
+    announce_appends(store, bus, dataset=dataset.name)
+
+
+# Datasets are loaded on first use. Unused ones are evicted after
+# DASHBOARD_DATASET_IDLE seconds, least recently used ones when the loaded
+# datasets take more than DASHBOARD_DATASET_MEMORY megabytes.
+dataset_memory = os.getenv("DASHBOARD_DATASET_MEMORY")
+registry = DatasetRegistry(
+    max_bytes=int(float(dataset_memory) * 2**20) if dataset_memory else None,
+    idle=float(os.getenv("DASHBOARD_DATASET_IDLE", "3600")),
+    setup=setup_dataset,
+)
+
+# Sample data, or replay an archive through the ingestion path when
+# DASHBOARD_REPLAY points at one (DASHBOARD_REPLAY_SPEED times real time)
+replay_path = os.getenv("DASHBOARD_REPLAY")
+registry.register(Dataset(
+    'metr-la',
+    title='METR-LA (Los Angeles)',
+    speeds=None if replay_path else sample_speeds,
+    connector=ReplayConnector(replay_path, loop=True,
+                              speed=float(os.getenv("DASHBOARD_REPLAY_SPEED", "1")))
+    if replay_path else None,
+    locations=lambda: sensor_locations,
+    elements=lambda: metr_la_network,
+    rollups=ROLLUPS,
+))
+registry.register(Dataset(
+    'pems-bay',
+    title='PEMS-BAY (Bay Area)',
+    speeds=pems_bay_sensors.sample_speeds,
+    locations=lambda: pems_bay_sensors.sensor_locations,
+    rollups=ROLLUPS,
+))
+# More regions from the JSON file in DASHBOARD_DATASETS
+if os.getenv("DASHBOARD_DATASETS"):
+    for custom in datasets_from_config(os.getenv("DASHBOARD_DATASETS")):
+        custom.rollups = ROLLUPS
+        registry.register(custom)
+
+
+def dataset_of(name):
+    """
+    Loaded dataset ``name``, the default one when unknown
+    """
+    return registry.get(name if name in registry else None)
+
+
+def store_of(name):
+    return registry.get(name).store
+
+
+# Graph edit state and view filters are kept server side, per page load
+sessions = store_from_env()
+
+
+def loaded_datasets(name=None):
+    """
+    Datasets in memory, only ``name`` when given
+    """
+    names = [name] if name else [d.name for d in registry]
+    return [d for d in map(registry.loaded, names) if d is not None]
+
+
+def merge_data_versions(pending, event):
+    """
+    One event covering the time ranges of two appends to a dataset
+    """
+    return dict(event, first=min(pending['first'], event['first'], key=pd.Timestamp),
+                last=max(pending['last'], event['last'], key=pd.Timestamp))
+
+
+def on_data_version(event):
+    """
+    Another process ingested rows. Workers keep their own store, which this
+    does not update: only the playback frames and heatmap tiles of the range
+    are dropped, tiles possibly being shared through DASHBOARD_TILE_DIR.
+    Forecasts follow the worker's own store on their schedule.
+    """
+    for dataset in loaded_datasets(event.get('dataset') or registry.default):
+        dataset.frames.clear()
+        dataset.pyramid.invalidate(pd.Timestamp(event['first']),
+                                   pd.Timestamp(event['last']))
+
+
+def on_graph_edit(event):
+    """
+    Another worker edited a session's graph, a local copy of it is stale
+    """
+    # Shared stores already hold the edit
+    if not sessions.shared:
+        sessions.forget(event['session'])
+
+
+# Appends are announced in bursts during a replay: handle them at most once
+# a second per dataset, off the bus thread
+bus.subscribe(DATA_VERSION, Debouncer(on_data_version,
+                                      key=lambda event: event.get('dataset'),
+                                      merge=merge_data_versions))
+bus.subscribe(GRAPH_EDIT, on_graph_edit)
+bus.start()
 
 # Get categories of sampel data set
 
@@ -52,11 +217,11 @@ layout_map = go.Layout(
         accesstoken=mapbox_access_token,
         bearing=0,
         center=dict(
-            lat=52,
-            lon=10
+            lat=sensor_locations['lat'].mean(),
+            lon=sensor_locations['lon'].mean()
         ),
         pitch=0,
-        zoom=6
+        zoom=9
     ),
     showlegend=False,
     margin={'r': 20,
@@ -86,8 +251,20 @@ layout_time_series = go.Layout( colorway=["#5E0DAC", '#FF4F00', '#375CB1', '#FF7
 )
 
 # Define dashboard layout
-app.layout = html.Div(children=[
+layout = html.Div(children=[
     html.H1(children='Dashboard Spatio-Temporal Data'),
+    html.Div(
+        [
+            html.Div(children="Dataset:"),
+            dcc.Dropdown(
+                id='dataset',
+                options=registry.options(),
+                value=registry.default,
+                clearable=False,
+            ),
+        ],
+        style={'width': '30%'}
+    ),
     html.Div(
         [
             html.Div(
@@ -95,7 +272,8 @@ app.layout = html.Div(children=[
                     html.Div(children="Select categories:"),
                     dcc.Dropdown(
                         id='dropdown',
-                        options=list(range(207)),
+                        # Sensors of the selected dataset
+                        options=[],
                         value=['ALL'],
                         clearable=False,
                         multi=True
@@ -140,19 +318,21 @@ app.layout = html.Div(children=[
                 [
                     # Timeserie                
                     dcc.Graph(id='timeseries', figure={
-                            'data': [go.Scatter(x=df.index, y=df["data"], mode='lines',)],
                             "layout": layout_time_series
                         }),
+                    # Bounds and range are set for the selected dataset
                     dcc.DatePickerRange(
                         id='date-picker',
-                        min_date_allowed=df.index.min().date(),
-                        max_date_allowed=df.index.max().date(),
-                        initial_visible_month=df.index.min().date(),
-                        start_date=df.index.min().date(),
-                        end_date=df.index.max().date(),
                         clearable=True,
                     ),
                     html.Div(id='text_output_range'),
+                    # Sensor by time heatmap, drawn from pre-rendered tiles
+                    dcc.Graph(id='heatmap', config={'displayModeBar': False}),
+                    html.Div([
+                        html.A('Export CSV', id='export-csv'),
+                        ' | ',
+                        html.A('Export Parquet', id='export-parquet'),
+                    ]),
                 ],
                 className='two columns',
                 style={'width': '48%'}
@@ -168,6 +348,16 @@ app.layout = html.Div(children=[
                             'displayModeBar': False,
                         },
                     ),
+                    # Playback of the selected date range
+                    html.Div([
+                        html.Button('Play', id='animation-play'),
+                        html.Span(id='animation-time', style={'marginLeft': 10}),
+                        dcc.Slider(id='animation-frame', min=0, max=0, step=1, value=0,
+                                   marks=None, updatemode='drag'),
+                        dcc.Interval(id='animation-interval', interval=200,
+                                     disabled=True),
+                        dcc.Store(id='animation-manifest'),
+                    ]),
                 ],
                 className='two columns',
                 style={'width': '48%'}
@@ -179,7 +369,7 @@ app.layout = html.Div(children=[
         # Graph node/edge
         cyto.Cytoscape(
             id='cytoscape',
-            elements=metr_la_network,
+            elements=[],
             layout={"name": "grid"},
             style={"height": "95vh", "width": "100%"},
         )
@@ -246,6 +436,30 @@ app.layout = html.Div(children=[
 ])
 
 
+# Streamed CSV/Parquet export of the data behind the charts
+register_export(app.server, store_of, sessions)
+# Frame chunks for playback
+register_animation(app.server, lambda name: registry.get(name).frames)
+# Heatmap tiles
+register_heatmap(app.server, lambda name: registry.get(name).pyramid)
+
+
+def serve_layout():
+    """
+    Layout with a fresh session key for every page load
+    """
+    return html.Div([
+        # The graph state is sized when the dataset is picked
+        dcc.Store(id='session-key', data=sessions.create(0)),
+        # Version of the graph elements the client shows
+        dcc.Store(id='graph-version'),
+        layout,
+    ])
+
+
+app.layout = serve_layout
+
+
 @app.callback(
     dash.dependencies.Output('bar-ts', 'figure'),
     [dash.dependencies.Input('dropdown', 'value'),
@@ -283,9 +497,11 @@ def update_bar_figure(selected_cause, aggregation):
     }
 
 
-@app.callback(
+@presentation(
+    app,
     dash.dependencies.Output('text_output_range', 'children'),
-    [dash.dependencies.Input('date-picker', 'start_date'), dash.dependencies.Input('date-picker', 'end_date')])
+    [dash.dependencies.Input('date-picker', 'start_date'),
+     dash.dependencies.Input('date-picker', 'end_date')])
 def update_output_text(start_date, end_date):
     """
     Print selected time range
@@ -294,109 +510,226 @@ def update_output_text(start_date, end_date):
     return res
 
 
+@presentation(
+    app,
+    dash.dependencies.Output('export-csv', 'href'),
+    dash.dependencies.Output('export-parquet', 'href'),
+    dash.dependencies.Input('session-key', 'data'))
+def update_export_links(session_key):
+    """
+    Export links for the session's time series chart
+    """
+    url = f"{app.get_relative_path('/export')}?session={session_key}"
+    return f"{url}&format=csv", f"{url}&format=parquet"
+
+
 @app.callback(
-    dash.dependencies.Output('point-map', 'figure'),
-    [dash.dependencies.Input('bar-ts', 'relayoutData'),
-     dash.dependencies.Input('dropdown', 'value')])
-def update_map_figure(relayoutData, selected_cause):
+    dash.dependencies.Output('dropdown', 'options'),
+    dash.dependencies.Output('dropdown', 'value'),
+    dash.dependencies.Output('date-picker', 'min_date_allowed'),
+    dash.dependencies.Output('date-picker', 'max_date_allowed'),
+    dash.dependencies.Output('date-picker', 'initial_visible_month'),
+    dash.dependencies.Output('date-picker', 'start_date'),
+    dash.dependencies.Output('date-picker', 'end_date'),
+    dash.dependencies.Input('dataset', 'value'),
+    dash.dependencies.State('session-key', 'data'))
+def select_dataset(dataset_name, session_key=None):
     """
-    Provide data to map
+    Sensor choices and date bounds of the selected dataset, loading it on
+    first use
     """
+    dataset = dataset_of(dataset_name)
+    remember_filters(session_key, dataset=dataset.name)
+    first, last = (t.date() if t is not None else None for t in dataset.time_range)
+    options = ['ALL'] + list(range(len(dataset.store.columns)))
+    return options, ['ALL'], first, last, first, first, last
 
-    # Select given time range and category
-    time_range = get_time_range_from_relayoutData(relayoutData)
-    selected_cause_list = cause_options_map[selected_cause]
-    df_filtered = df[(df.dtg >= time_range[0]) &
-                     (df.dtg <= time_range[1]) &
-                     df.cause.isin(selected_cause_list)]
 
-    data = []
-    for cause in sorted(selected_cause_list):
-        data.append(
-            go.Scattermapbox(
-                lon=df_filtered[df_filtered.cause == cause]['lon'],
-                lat=df_filtered[df_filtered.cause == cause]['lat'],
-                mode='markers',
-                marker=dict(
-                    size=8,
-                    # color='rgb(255, 0, 0)',
-                    color=cause_colors_map[cause],
-                    opacity=0.7
-                ),
-                name=cause,
-                hoverinfo='name'
-            )
+@app.callback(
+    dash.dependencies.Output('point-map', 'figure'),
+    [dash.dependencies.Input('dropdown', 'value'),
+     dash.dependencies.Input('dataset', 'value')])
+def update_map_figure(selected_sensors, dataset_name=None):
+    """
+    Provide data to map, colored by the predicted speed at the end of the
+    forecast horizon
+    """
+    return map_figure(selected_sensors, dataset_name)
+
+
+@admission.guard(INTERACTIVE)
+def map_figure(selected_sensors, dataset_name):
+    dataset = dataset_of(dataset_name)
+    sensors = dataset.locations
+    if selected_sensors and 'ALL' not in selected_sensors:
+        sensors = dataset.locations.loc[[int(s) for s in selected_sensors]]
+
+    marker = dict(size=8, color='rgb(55, 92, 177)', opacity=0.7)
+    hover = [f"Sensor {s}" for s in sensors.index]
+    forecast = dataset.forecast.latest()
+    if forecast is not None:
+        predicted = pd.Series(forecast.iloc[-1].to_numpy()[sensors.index],
+                              index=sensors.index)
+        marker.update(color=predicted.values, colorscale='RdYlGn', cmin=0, cmax=70,
+                      colorbar=dict(title='Predicted mph'))
+        hover = [f"Sensor {s}: {v:.1f} mph at {forecast.index[-1]}"
+                 for s, v in predicted.items()]
+
+    data = [
+        go.Scattermapbox(
+            lon=sensors['lon'],
+            lat=sensors['lat'],
+            mode='markers',
+            marker=marker,
+            # Sensor positions, used to color the markers during playback
+            customdata=list(sensors.index),
+            text=hover,
+            hoverinfo='text'
         )
+    ]
 
+    layout = go.Layout(layout_map)
+    layout.mapbox.center = dict(lat=dataset.locations['lat'].mean(),
+                                lon=dataset.locations['lon'].mean())
     return {
         'data': data,
-        'layout': layout_map
+        'layout': layout
     }
 
+
+@app.callback(
+    dash.dependencies.Output('animation-manifest', 'data'),
+    dash.dependencies.Output('animation-frame', 'max'),
+    dash.dependencies.Output('animation-frame', 'value'),
+    [dash.dependencies.Input('date-picker', 'start_date'),
+     dash.dependencies.Input('date-picker', 'end_date'),
+     dash.dependencies.Input('dataset', 'value')])
+@admission.guard(QUERY)
+def update_animation_manifest(start, end, dataset_name=None):
+    """
+    Describe the frames of the selected range for clientside playback
+    """
+    dataset = dataset_of(dataset_name)
+    try:
+        manifest = dataset.frames.manifest(start, end,
+                                           url=app.get_relative_path('/animation'))
+    except ValueError:
+        # Range too long to animate
+        return None, 0, 0
+    manifest['query'] += f'&dataset={dataset.name}'
+    manifest['nodes'] = dataset.node_sensors
+    return manifest, max(manifest['frames'] - 1, 0), 0
+
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'toggle'),
+    dash.dependencies.Output('animation-interval', 'disabled'),
+    dash.dependencies.Output('animation-play', 'children'),
+    dash.dependencies.Input('animation-play', 'n_clicks'),
+    dash.dependencies.State('animation-interval', 'disabled'),
+    prevent_initial_call=True,
+)
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'step'),
+    dash.dependencies.Output('animation-frame', 'value', allow_duplicate=True),
+    dash.dependencies.Input('animation-interval', 'n_intervals'),
+    dash.dependencies.State('animation-frame', 'value'),
+    dash.dependencies.State('animation-manifest', 'data'),
+    prevent_initial_call=True,
+)
+
+app.clientside_callback(
+    ClientsideFunction('animation', 'render'),
+    dash.dependencies.Output('point-map', 'figure', allow_duplicate=True),
+    dash.dependencies.Output('cytoscape', 'stylesheet'),
+    dash.dependencies.Output('animation-time', 'children'),
+    dash.dependencies.Input('animation-frame', 'value'),
+    dash.dependencies.State('animation-manifest', 'data'),
+    dash.dependencies.State('point-map', 'figure'),
+    prevent_initial_call=True,
+)
+
+
 @app.callback(
     dash.dependencies.Output("cytoscape", "elements"),
+    dash.dependencies.Output("graph-version", "data"),
     dash.dependencies.Input("remove-button", "n_clicks"),
     dash.dependencies.Input("select-button", "n_clicks"),
     dash.dependencies.Input("reset-button", "n_clicks"),
-    dash.dependencies.State("cytoscape", "elements"),
-    dash.dependencies.State("cytoscape", "selectedNodeData"),    
+    dash.dependencies.Input("dataset", "value"),
+    dash.dependencies.State("session-key", "data"),
+    dash.dependencies.State("cytoscape", "selectedNodeData"),
+    dash.dependencies.State("graph-version", "data"),
 )
-def network_graph_callback_dispatcher(remove, select, reset, elements, data):
+def network_graph_callback_dispatcher(remove, select, reset, dataset_name, session_key,
+                                      data, version=None):
+    """
+    Apply a graph edit to the session's graph state and send the client only
+    the elements to delete or insert. Picking a dataset sends its whole graph,
+    and so does an edit of a client whose ``version`` is not the one the
+    server last sent.
+    """
     elem = ctx.triggered_id
-    if elem == "remove-button":
-        return remove_selected_nodes(elements=elements, data=data)
-    elif elem == "select-button":
-        return select_nodes(elements=elements, data=data)
-    elif elem == "reset-button":
-        return reset_graph()
-    else:
+    if elem not in (None, "dataset", "remove-button", "select-button", "reset-button"):
         raise ValueError("Invalid object")
-
-def reset_graph():
-    return metr_la_network 
-
-
-def remove_selected_nodes(elements, data):
-    if elements and data:
-        ids_to_remove = {ele_data["id"] for ele_data in data}
-        print("Before:", elements)
-        new_elements = [
-            ele for ele in elements if ele["data"]["id"] not in ids_to_remove
-        ]
-        print("After:", new_elements)
-        return new_elements
-
-    return elements
-
-def select_nodes(elements, data):
-    if elements and data:
-        ids_to_keep = {ele_data["id"] for ele_data in data}
-        print("Before:", elements)
-        new_elements = [
-            ele for ele in elements if (ele["data"]["id"] in ids_to_keep) or \
-            (ele["data"].get("source") and ele["data"]["source"] in ids_to_keep and ele["data"]["target"] in ids_to_keep) 
-        ]
-        print("After:", new_elements)
-        return new_elements
-
-    return elements
-
-
-@app.callback(
-    dash.dependencies.Output("tap-node-data-json-output", "children"), dash.dependencies.Input("cytoscape", "tapNodeData")
+    dataset = dataset_of(dataset_name)
+    graph = dataset.graph
+
+    with sessions.lock(session_key):
+        state = sessions.get(session_key)
+        if state is None:
+            state = SessionState(len(graph))
+        # Session evicted, a dataset picked, or the graph state was built against
+        # another graph (e.g. by a worker with a different base network): start
+        # over from the full network and send the whole list
+        resync = (elem in (None, "dataset") or state.dataset != dataset.name
+                  or getattr(state, 'fingerprint', None) != graph.fingerprint)
+        if resync:
+            state.graph = GraphState(len(graph))
+            state.dataset = dataset.name
+            state.fingerprint = graph.fingerprint
+
+        ids = [ele_data["id"] for ele_data in data or []]
+        if resync:
+            update = state.graph.elements(graph)
+        elif elem == "remove-button" and ids:
+            update = state.graph.remove(graph, ids, version)
+        elif elem == "select-button" and ids:
+            update = state.graph.keep(graph, ids, version)
+        elif elem == "reset-button":
+            update = state.graph.reset(graph, version)
+        elif version != state.graph.digest(graph):
+            update = state.graph.elements(graph)
+        else:
+            return dash.no_update, dash.no_update
+
+        if session_key:
+            sessions.put(session_key, state)
+            bus.publish(GRAPH_EDIT, session=session_key)
+        return update, state.graph.digest(graph)
+
+
+@presentation(
+    app,
+    dash.dependencies.Output("tap-node-data-json-output", "children"),
+    dash.dependencies.Input("cytoscape", "tapNodeData"),
 )
 def displayTapNodeData(data):
     return json.dumps(data, indent=2)
 
 
-@app.callback(
-    dash.dependencies.Output("tap-edge-data-json-output", "children"), dash.dependencies.Input("cytoscape", "tapEdgeData")
+@presentation(
+    app,
+    dash.dependencies.Output("tap-edge-data-json-output", "children"),
+    dash.dependencies.Input("cytoscape", "tapEdgeData"),
 )
 def displayTapEdgeData(data):
     return json.dumps(data, indent=2)
 
 
-@app.callback(
+@presentation(
+    app,
     dash.dependencies.Output("selected-node-data-json-output", "children"),
     dash.dependencies.Input("cytoscape", "selectedNodeData"),
 )
@@ -404,25 +737,144 @@ def displaySelectedNodeData(data):
     return json.dumps(data, indent=2)
 
 
-@app.callback(
+@presentation(
+    app,
     dash.dependencies.Output("selected-edge-data-json-output", "children"),
     dash.dependencies.Input("cytoscape", "selectedEdgeData"),
 )
 def displaySelectedEdgeData(data):
     return json.dumps(data, indent=2)
 
-df = pd.DataFrame(np.random.randn(100, 1), columns=['data'], index=pd.date_range('1/1/2020', periods=100))
+
+def remember_filters(session_key, **filters):
+    """
+    Record the view filters of a session server side
+    """
+    if not session_key:
+        return
+    with sessions.lock(session_key):
+        state = sessions.get(session_key)
+        if state is not None:
+            state.filters.update(filters)
+            sessions.put(session_key, state)
+
+
+def select_sensor(frame, node_id):
+    """
+    Column of a (time, sensor) frame for ``node_id``, or the mean over all
+    sensors when ``node_id`` is -1
+    """
+    try:
+        node_id = int(node_id)
+    except (TypeError, ValueError):
+        node_id = -1
+    if not 0 <= node_id < frame.shape[1]:
+        return frame.mean(axis=1)
+    return frame.iloc[:, node_id]
 
 
 @app.callback(
     dash.dependencies.Output('timeseries', 'figure'), 
-    [dash.dependencies.Input('date-picker', 'start_date'), dash.dependencies.Input('date-picker', 'end_date'), dash.dependencies.Input("aggregation", "value")])
-def update_chart(start, end, frequency):
-    dff = df.loc[start: end].resample(frequency).mean()
-    fig = px.line(dff, x=dff.index, y='data')
+    [dash.dependencies.Input('date-picker', 'start_date'),
+     dash.dependencies.Input('date-picker', 'end_date'),
+     dash.dependencies.Input("aggregation", "value"),
+     dash.dependencies.Input('node_id', 'value'),
+     dash.dependencies.Input('dataset', 'value')],
+    dash.dependencies.State('session-key', 'data'))
+def update_chart(start, end, frequency, node_id=-1, dataset_name=None,
+                 session_key=None):
+    remember_filters(session_key, start=start, end=end, aggregation=frequency,
+                     node_id=node_id)
+    return chart_figure(start, end, frequency, node_id, dataset_name)
+
+
+def coarse_chart_figure(start, end, frequency, node_id, dataset_name):
+    """
+    The chart from the daily rollup, served when the worker is overloaded
+    """
+    return chart_figure.__wrapped__(start, end, ROLLUPS[-1], node_id, dataset_name)
+
+
+@admission.guard(QUERY, fallback=coarse_chart_figure)
+def chart_figure(start, end, frequency, node_id, dataset_name):
+    dataset = dataset_of(dataset_name)
+    start, end = day_range(start, end)
+    # Served from the ingestion rollups when the window is one of ROLLUPS
+    dff = select_sensor(dataset.store.resample(frequency, start, end), node_id)
+    dff = dff.to_frame('speed')
+    fig = px.line(dff, x=dff.index, y='speed')
+
+    # Overlay the cached forecast, over the same range and bins as the chart
+    forecast = dataset.forecast.latest()
+    if forecast is not None:
+        predicted = select_sensor(forecast, node_id).loc[start:end]
+        predicted = predicted.resample(frequency).mean().dropna()
+        if len(predicted):
+            fig.add_scatter(x=predicted.index, y=predicted.values, mode='lines',
+                            name='forecast', line={'dash': 'dot'})
     return fig
 
 
+@app.callback(
+    dash.dependencies.Output('heatmap', 'figure'),
+    [dash.dependencies.Input('date-picker', 'start_date'),
+     dash.dependencies.Input('date-picker', 'end_date'),
+     dash.dependencies.Input('heatmap', 'relayoutData'),
+     dash.dependencies.Input('dataset', 'value')])
+def update_heatmap(start, end, relayout=None, dataset_name=None):
+    """
+    Place the heatmap tiles of the level matching the visible time range
+    """
+    # relayoutData keeps the last zoom: it only applies when it just changed
+    zoom = relayout if ctx.triggered_id == 'heatmap' else None
+    return heatmap_figure(start, end, zoom, dataset_name)
+
+
+@admission.guard(INTERACTIVE)
+def heatmap_figure(start, end, zoom, dataset_name):
+    dataset = dataset_of(dataset_name)
+    store, pyramid = dataset.store, dataset.pyramid
+    if store.last is None:
+        # Nothing ingested yet
+        raise dash.exceptions.PreventUpdate
+    start, end = day_range(start or store.first, end or store.last)
+    if zoom and 'xaxis.range[0]' in zoom:
+        zoom = (pd.Timestamp(zoom['xaxis.range[0]']),
+                pd.Timestamp(zoom['xaxis.range[1]']))
+        # A zoom outside the data is left over from another dataset
+        if zoom[0] <= store.last and zoom[1] >= store.first:
+            start, end = zoom
+
+    level, tiles = pyramid.visible(start, end)
+    images = []
+    for row, col in tiles:
+        tile_start, tile_end = pyramid.span(level, col)
+        source = app.get_relative_path(f'/heatmap/{level}/{row}/{col}.png')
+        source += f'?dataset={dataset.name}'
+        if not pyramid.complete(level, col):
+            # Tiles still filling up change with every append
+            source += f'&v={store.version}'
+        images.append(dict(
+            source=source, xref='x', yref='y', x=tile_start, y=row * TILE,
+            sizex=(tile_end - tile_start).total_seconds() * 1000,
+            sizey=min(TILE, len(pyramid.order) - row * TILE),
+            xanchor='left', yanchor='top', sizing='stretch', layer='below',
+        ))
+
+    sensors = len(pyramid.order)
+    return {
+        'data': [go.Scatter(x=[start, end], y=[0, sensors], mode='markers',
+                            marker={'opacity': 0}, hoverinfo='skip')],
+        'layout': go.Layout(
+            images=images,
+            xaxis={'range': [start, end], 'type': 'date'},
+            yaxis={'range': [sensors, 0], 'title': 'Sensor (corridor order)'},
+            height=400,
+            margin={'r': 5, 't': 20, 'b': 40, 'l': 60},
+            showlegend=False,
+        ),
+    }
+
 
 def get_time_range_from_relayoutData(relayoutData):
     """
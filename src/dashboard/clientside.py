@@ -0,0 +1,71 @@
+"""
+Server or client: where each callback of the app runs.
+
+Callbacks that only format what the browser already has (a date range string,
+Cytoscape selection data as JSON, links) cost a round trip to a Flask worker
+per interaction without touching any data. Decorating them with
+:func:`presentation` runs them in the browser instead, as the function of the
+same name in ``assets/presentation.js``. The Python function stays the
+reference implementation: it is registered as a regular server callback
+instead when ``DASHBOARD_CLIENTSIDE=0``, e.g. to debug a view.
+:func:`classify` reports where every callback of an app runs.
+"""
+
+import os
+
+from dash import ClientsideFunction
+
+#: Namespace of the JavaScript functions in ``assets/presentation.js``
+NAMESPACE = "presentation"
+
+CLIENT = "client"
+SERVER = "server"
+
+
+def clientside_enabled():
+    """Whether presentation callbacks run in the browser (``DASHBOARD_CLIENTSIDE``)"""
+    return os.getenv("DASHBOARD_CLIENTSIDE", "1").lower() not in ("0", "false", "no")
+
+
+def presentation(app, *dependencies, namespace=NAMESPACE, function_name=None,
+                 server=None, **kwargs):
+    """
+    Decorator for callbacks that do no data work, registered as the
+    clientside function ``namespace.function_name`` (the Python function's
+    name by default)
+
+    Args:
+      app (dash.Dash): app to register with
+      dependencies: outputs, inputs and states as for ``app.callback``
+      server (bool): run on the server, by default only when
+        :func:`clientside_enabled` is false
+      kwargs: passed on, e.g. ``prevent_initial_call``
+
+    Returns:
+      the decorated function, unchanged
+    """
+
+    def decorator(func):
+        if server if server is not None else not clientside_enabled():
+            return app.callback(*dependencies, **kwargs)(func)
+        app.clientside_callback(
+            ClientsideFunction(namespace, function_name or func.__name__),
+            *dependencies,
+            **kwargs,
+        )
+        return func
+
+    return decorator
+
+
+def classify(app):
+    """
+    Where every callback of ``app`` runs
+
+    Returns:
+      dict: :data:`CLIENT` or :data:`SERVER` per callback output
+    """
+    return {
+        callback["output"]: CLIENT if callback.get("clientside_function") else SERVER
+        for callback in app._callback_list
+    }
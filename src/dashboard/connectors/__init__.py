@@ -1 +1,3 @@
-from .kafka import KafkaConnector
\ No newline at end of file
+from .kafka import KafkaConnector
+from .pacing import PacingScheduler
+from .replay import ReplayConnector
@@ -5,8 +5,8 @@ class BaseConnector(ABC):
     _client: None
 
     @abstractmethod
-    def connect():
+    def connect(self):
         raise NotImplementedError
 
 
-    
\ No newline at end of file
+    
@@ -0,0 +1,55 @@
+import time
+
+
+class PacingScheduler:
+    """
+    Pace events stamped with their original (event) time so that they are
+    released ``speed`` times faster than they happened.
+
+    The first event is released immediately and anchors both clocks; a later
+    event at event time ``t`` is released once ``(t - t0) / speed`` seconds of
+    wall time have passed. ``speed=float("inf")`` releases everything at once.
+
+    Args:
+      speed (float): replay speed relative to real time, e.g. 1 to 1000
+      clock (callable): monotonic wall clock in seconds
+      sleep (callable): blocking sleep in seconds
+    """
+
+    def __init__(self, speed=1.0, clock=time.monotonic, sleep=time.sleep):
+        if not speed > 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+
+    def reset(self):
+        """Forget the anchor, the next event is released immediately"""
+        self._event_origin = None
+        self._wall_origin = None
+        self.max_lag = 0.0
+
+    def due(self, event_time):
+        """Wall clock time at which ``event_time`` (seconds) is due"""
+        if self._event_origin is None:
+            self._event_origin, self._wall_origin = event_time, self.clock()
+        return self._wall_origin + (event_time - self._event_origin) / self.speed
+
+    def wait(self, event_time):
+        """
+        Block until ``event_time`` (seconds) is due, returns the lag in
+        seconds when the caller is already behind schedule
+        """
+        delay = self.due(event_time) - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+            return 0.0
+        self.max_lag = max(self.max_lag, -delay)
+        return -delay
+
+    def pace(self, events, key):
+        """Yield ``events`` in order, each once ``key(event)`` is due"""
+        for event in events:
+            self.wait(key(event))
+            yield event
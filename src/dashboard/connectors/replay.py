@@ -0,0 +1,261 @@
+"""
+Replay an archived speed matrix into the ingestion path.
+
+:class:`ReplayConnector` reads a METR-LA style speed matrix (HDF5 or Parquet,
+one row per timestamp, one column per sensor) and appends it to a
+:class:`~dashboard.ingestion.SpeedStore` paced at 1x to 1000x real time, so
+the live path can be demoed and soak tested without a live feed::
+
+    dashboard-replay metr-la.h5 --speed 1000
+"""
+
+import argparse
+import logging
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from dashboard import __version__
+from dashboard.connectors.base import BaseConnector
+from dashboard.connectors.pacing import PacingScheduler
+from dashboard.events import SocketEventBus, announce_appends
+from dashboard.ingestion import SpeedStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+_logger = logging.getLogger(__name__)
+
+
+def read_speed_matrix(path, key="df"):
+    """
+    Speed matrix stored at ``path``, ``.h5``/``.hdf5`` (``key`` as in the
+    METR-LA release) or ``.parquet``
+    """
+    path = str(path)
+    if path.endswith((".h5", ".hdf5")):
+        frame = pd.read_hdf(path, key)
+    elif path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    else:
+        raise ValueError(f"Unsupported speed matrix format: {path}")
+    frame.index = pd.DatetimeIndex(frame.index)
+    return frame.sort_index()
+
+
+class ReplayConnector(BaseConnector):
+    """
+    Stream an archived speed matrix into a store
+
+    Args:
+      source: path to the archive, or a ``(time, sensor)`` DataFrame
+      speed (float): replay speed relative to real time
+      batch (int): rows appended at once
+      loop (bool): start over, shifted in time, when the archive ends
+      key (str): HDF5 key of the matrix
+    """
+
+    def __init__(self, source, speed=1.0, batch=1, loop=False, key="df"):
+        self.source = source
+        self.batch = batch
+        self.loop = loop
+        self.key = key
+        self._client = None
+        self._stopped = threading.Event()
+        # Sleeping on the stop event lets stop() interrupt slow replays
+        self.scheduler = PacingScheduler(speed, sleep=self._stopped.wait)
+        self._thread = None
+        self.rows = 0
+        self.elapsed = 0.0
+
+    @property
+    def frame(self):
+        return self._client
+
+    def connect(self):
+        if self._client is None:
+            if isinstance(self.source, pd.DataFrame):
+                self._client = self.source
+            else:
+                self._client = read_speed_matrix(self.source, self.key)
+        return self._client
+
+    def make_store(self, **kwargs):
+        """Empty store with the archive's sensors"""
+        return SpeedStore(self.connect().columns, **kwargs)
+
+    def stream(self, store, max_rows=None):
+        """
+        Append the archive to ``store`` in paced batches until it ends (or
+        ``max_rows`` rows were sent, or :meth:`stop` is called)
+
+        Returns:
+          int: rows appended
+        """
+        frame = self.connect()
+        times = frame.index.asi8
+        values = frame.to_numpy(dtype=np.float32)
+        if len(times) < 2:
+            raise ValueError("Need at least two rows to replay")
+        period = int(np.median(np.diff(times)))
+        sent = 0
+        started = time.perf_counter()
+        self.scheduler.reset()
+        try:
+            for shift in self._shifts(times[-1] - times[0] + period):
+                for lo in range(0, len(times), self.batch):
+                    hi = min(lo + self.batch, len(times))
+                    if max_rows is not None:
+                        hi = min(hi, lo + max_rows - sent)
+                    if hi <= lo or self._stopped.is_set():
+                        return sent
+                    self.scheduler.wait((times[lo] + shift) / 1e9)
+                    store.append(times[lo:hi] + shift, values[lo:hi])
+                    sent += hi - lo
+            return sent
+        finally:
+            self.rows += sent
+            self.elapsed += time.perf_counter() - started
+
+    def _shifts(self, span):
+        """Time offsets of successive passes over the archive"""
+        shift = 0
+        while True:
+            yield shift
+            if not self.loop:
+                return
+            shift += span
+
+    def start(self, store, **kwargs):
+        """Run :meth:`stream` in a background thread"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.stream, args=(store,),
+                                        kwargs=kwargs, name="replay", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """Throughput achieved so far"""
+        return {
+            "rows": self.rows,
+            "elapsed": self.elapsed,
+            "rows_per_second": self.rows / self.elapsed if self.elapsed else 0.0,
+            "max_lag": self.scheduler.max_lag,
+        }
+
+
+# ---- CLI ----
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--help"]``).
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(description="Replay an archived speed matrix")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"dashboard {__version__}",
+    )
+    parser.add_argument(dest="path", help="speed matrix (.h5/.hdf5 or .parquet)")
+    parser.add_argument("-s", "--speed", type=float, default=1.0,
+                        help="replay speed relative to real time, 'inf' for unpaced")
+    parser.add_argument("-b", "--batch", type=int, default=1, help="rows per append")
+    parser.add_argument("-n", "--max-rows", type=int, default=None,
+                        help="stop after this many rows")
+    parser.add_argument("--key", default="df", help="HDF5 key of the matrix")
+    parser.add_argument("--loop", action="store_true",
+                        help="replay the archive forever")
+    parser.add_argument(
+        "--rollups", nargs="*", default=["1h", "1D"],
+        help="rollup frequencies maintained during ingestion",
+    )
+    parser.add_argument(
+        "--events", metavar="DIR", default=None,
+        help="announce every append on the event bus in DIR (see DASHBOARD_EVENT_DIR)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+    return parser.parse_args(args)
+
+
+def setup_logging(loglevel):
+    """Setup basic logging
+
+    Args:
+      loglevel (int): minimum loglevel for emitting messages
+    """
+    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+    logging.basicConfig(
+        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+
+def main(args):
+    """Replay an archive into an in-memory store and print the throughput
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--speed", "1000", "metr-la.h5"]``).
+    """
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+    connector = ReplayConnector(args.path, speed=args.speed, batch=args.batch,
+                                loop=args.loop, key=args.key)
+    store = connector.make_store(rollups=args.rollups)
+    notifications = []
+    store.subscribe(lambda version, first, last: notifications.append(version))
+    if args.events:
+        announce_appends(store, SocketEventBus(args.events))
+    try:
+        connector.stream(store, max_rows=args.max_rows)
+    except KeyboardInterrupt:
+        pass
+    stats = connector.stats()
+    print(f"{stats['rows']} rows x {len(store.columns)} sensors "
+          f"in {stats['elapsed']:.2f} s: "
+          f"{stats['rows_per_second']:.1f} rows/s, "
+          f"{stats['rows_per_second'] * len(store.columns):.0f} values/s, "
+          f"{len(notifications)} push updates, max lag {stats['max_lag'] * 1e3:.1f} ms")
+
+
+def run():
+    """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
+
+    This function can be used as entry point to create console scripts with setuptools.
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
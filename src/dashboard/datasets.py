@@ -0,0 +1,348 @@
+"""
+Registry of the regions a deployment serves.
+
+A :class:`Dataset` says where a region's speeds, sensor locations and sensor
+graph come from. The :class:`DatasetRegistry` loads a dataset the first time
+it is asked for, accounts for the memory each loaded dataset holds, and
+evicts datasets that sat idle too long, or the least recently used ones when
+the total goes over budget. Replayed datasets stay loaded. One deployment
+can serve many regions without loading all of them at boot.
+
+Custom datasets are described in a JSON file (see :func:`datasets_from_config`)::
+
+    [{"name": "seattle", "title": "Seattle",
+      "speeds": "seattle.parquet", "locations": "seattle-sensors.csv",
+      "graph": "seattle-edges.csv"}]
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from dashboard.connectors.replay import read_speed_matrix
+from dashboard.graph import CompactGraph
+from dashboard.ingestion import SpeedStore
+from dashboard.instrumentation import record_cache
+
+_logger = logging.getLogger(__name__)
+
+
+def sensor_labels(count):
+    return [f"Sensor {i}" for i in range(count)]
+
+
+def nearest_neighbour_graph(locations, k=2, chunk=256):
+    """
+    Graph linking every sensor to its ``k`` nearest sensors, for datasets
+    that come without an adjacency
+
+    Args:
+      locations (pandas.DataFrame): ``lat``/``lon`` per sensor position
+      chunk (int): sensors whose distances are computed at once
+    """
+    lat, lon = locations[["lat", "lon"]].to_numpy(dtype=np.float64).T
+    count = len(lat)
+    k = max(min(k, count - 1), 0)
+    neighbours = np.empty((count, k), dtype=np.int64)
+    for lo in range(0, count, chunk):
+        rows = np.arange(lo, min(lo + chunk, count))
+        distance = (lat[rows, None] - lat) ** 2 + (lon[rows, None] - lon) ** 2
+        distance[np.arange(len(rows)), rows] = np.inf
+        # The k + 1 closest, so that ties at the k-th break on position
+        if k + 1 < count:
+            candidates = np.argpartition(distance, k, axis=1)[:, :k + 1]
+        else:
+            candidates = np.broadcast_to(np.arange(count), distance.shape)
+        nearest = np.take_along_axis(distance, candidates, axis=1)
+        order = np.lexsort((candidates, nearest), axis=1)[:, :k]
+        neighbours[rows] = np.take_along_axis(candidates, order, axis=1)
+    return CompactGraph.from_edges(count, np.repeat(np.arange(count), k),
+                                   neighbours.ravel(), labels=sensor_labels(count))
+
+
+def edge_list_graph(edges, count):
+    """
+    Graph of ``count`` sensors linked by ``edges``, a DataFrame of
+    ``source``/``target`` sensor positions
+    """
+    return CompactGraph.from_edges(count, edges["source"].to_numpy(),
+                                   edges["target"].to_numpy(),
+                                   labels=sensor_labels(count))
+
+
+def node_sensors(graph, count):
+    """Sensor position of every graph node whose id is a position below ``count``"""
+    ids = map(graph.node_id, range(graph.nodes))
+    return {i: int(i) for i in ids if i.isdigit() and int(i) < count}
+
+
+class Dataset:
+    """
+    Where a region's data comes from. Nothing is read until :meth:`load`.
+
+    Args:
+      name (str): key in URLs and in the dataset dropdown
+      speeds (callable): returns the ``(time, sensor)`` speed DataFrame
+      locations (callable): returns ``lat``/``lon`` per sensor position
+      elements (callable): returns the sensor graph, as a
+        :class:`~dashboard.graph.CompactGraph` or as Cytoscape elements, a
+        nearest neighbour graph of the locations by default
+      connector (ReplayConnector): replays the speeds into the store instead
+        of ``speeds``
+      title (str): label in the dropdown
+      rollups (list): fixed frequencies to maintain rollups for
+    """
+
+    def __init__(self, name, speeds=None, locations=None, elements=None, connector=None,
+                 title=None, rollups=("1h", "1D")):
+        if (speeds is None) == (connector is None):
+            raise ValueError("Give exactly one of speeds and connector")
+        self.name = name
+        self.speeds = speeds
+        self.locations = locations
+        self.elements = elements
+        self.connector = connector
+        self.title = title or name
+        self.rollups = list(rollups)
+
+    def load(self):
+        """Read the dataset, returns a :class:`LoadedDataset`"""
+        if self.connector is not None:
+            frame = self.connector.connect()
+            store = self.connector.make_store(rollups=self.rollups)
+        else:
+            frame = self.speeds()
+            store = SpeedStore.from_frame(frame, rollups=self.rollups)
+        locations = self.locations()
+        if len(locations) != len(store.columns):
+            raise ValueError(f"{self.name}: {len(locations)} locations for "
+                             f"{len(store.columns)} sensors")
+        graph = (self.elements() if self.elements is not None
+                 else nearest_neighbour_graph(locations))
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_elements(graph)
+
+        loaded = LoadedDataset(self, store, locations, graph)
+        if self.connector is not None:
+            # The archive is held for the replay and bounds the date picker
+            loaded.add("archive", frame)
+            self.connector.start(store)
+            loaded.on_close(self.connector.stop)
+        return loaded
+
+
+class LoadedDataset:
+    """
+    A dataset in memory: its store, locations and graph, plus the views the
+    app attaches with :meth:`add`
+
+    Args:
+      dataset (Dataset): what was loaded
+      store (SpeedStore): speeds
+      locations (pandas.DataFrame): ``lat``/``lon`` per sensor position
+      graph (CompactGraph): sensor graph
+    """
+
+    def __init__(self, dataset, store, locations, graph):
+        self.dataset = dataset
+        self.name = dataset.name
+        self.store = store
+        self.locations = locations
+        self.graph = graph
+        self.node_sensors = node_sensors(graph, len(store.columns))
+        self.last_used = 0.0
+        self._components = []
+        self._closers = []
+
+    def add(self, name, component, close=None):
+        """
+        Attach ``component`` as attribute ``name``, counted in :attr:`nbytes`
+        when it has an ``nbytes`` attribute (or is a DataFrame) and closed
+        with ``close()`` on eviction
+        """
+        setattr(self, name, component)
+        self._components.append(component)
+        if close is not None:
+            self.on_close(close)
+        return component
+
+    def on_close(self, callback):
+        self._closers.append(callback)
+
+    @property
+    def time_range(self):
+        """First and last timestamp, of the archive while a replay starts up"""
+        if len(self.store):
+            return self.store.first, self.store.last
+        archive = getattr(self, "archive", None)
+        if archive is not None and len(archive):
+            return archive.index[0], archive.index[-1]
+        return None, None
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the store, the locations, the graph and the attached
+        components
+        """
+        total = self.store.nbytes + int(self.locations.memory_usage(deep=True).sum())
+        total += self.graph.nbytes
+        for component in self._components:
+            if isinstance(component, pd.DataFrame):
+                total += int(component.memory_usage(deep=True).sum())
+            else:
+                total += getattr(component, "nbytes", 0)
+        return total
+
+    def close(self):
+        for callback in reversed(self._closers):
+            try:
+                callback()
+            except Exception:  # noqa: BLE001
+                _logger.exception("Closing dataset %s failed", self.name)
+        self._closers.clear()
+
+
+class DatasetRegistry:
+    """
+    Datasets by name, loaded on first access
+
+    Args:
+      max_bytes (int): memory budget of the loaded datasets, unlimited by default
+      idle (float): seconds after which an unused dataset is evicted
+      setup (callable): ``setup(loaded)`` attaches the app's views to a newly
+        loaded dataset
+      clock (callable): monotonic time in seconds
+    """
+
+    def __init__(self, max_bytes=None, idle=None, setup=None, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.idle = idle
+        self.setup = setup
+        self.clock = clock
+        self._datasets = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self._load_locks = defaultdict(threading.Lock)
+
+    def register(self, dataset):
+        self._datasets[dataset.name] = dataset
+        return dataset
+
+    def __contains__(self, name):
+        return name in self._datasets
+
+    def __iter__(self):
+        return iter(self._datasets.values())
+
+    @property
+    def default(self):
+        """Name of the first registered dataset"""
+        return next(iter(self._datasets))
+
+    def options(self):
+        """Dropdown options of every registered dataset"""
+        return [{"label": d.title, "value": d.name} for d in self._datasets.values()]
+
+    def loaded(self, name):
+        """The dataset if it is in memory, never loads it"""
+        with self._lock:
+            return self._loaded.get(name)
+
+    def get(self, name=None):
+        """
+        The loaded dataset ``name`` (the default one when ``None``), loading
+        it first if needed. Raises :class:`KeyError` for unknown names.
+        """
+        name = name or self.default
+        dataset = self._datasets[name]
+        with self._lock:
+            loaded = self._loaded.get(name)
+        record_cache(loaded is not None, cache="dataset")
+        if loaded is None:
+            with self._load_locks[name]:
+                loaded = self.loaded(name)
+                if loaded is None:
+                    started = time.perf_counter()
+                    loaded = dataset.load()
+                    if self.setup is not None:
+                        self.setup(loaded)
+                    _logger.info("Loaded dataset %s (%d bytes) in %.2f s", name,
+                                 loaded.nbytes, time.perf_counter() - started)
+                    with self._lock:
+                        self._loaded[name] = loaded
+        loaded.last_used = self.clock()
+        self.evict(keep=name)
+        return loaded
+
+    def nbytes(self):
+        """Memory held by all loaded datasets"""
+        with self._lock:
+            loaded = list(self._loaded.values())
+        return sum(d.nbytes for d in loaded)
+
+    def unload(self, name):
+        """Evict ``name`` if it is loaded"""
+        with self._lock:
+            loaded = self._loaded.pop(name, None)
+        if loaded is not None:
+            _logger.info("Evicted dataset %s", name)
+            loaded.close()
+        return loaded is not None
+
+    def evict(self, keep=None):
+        """
+        Evict idle datasets, then least recently used ones while over the
+        memory budget. ``keep`` is never evicted, and neither are datasets
+        fed by a connector: loading one again would restart its replay from
+        the beginning, moving every session's data backwards.
+        """
+        now = self.clock()
+        with self._lock:
+            loaded = sorted(self._loaded.values(), key=lambda d: d.last_used)
+        candidates = [d for d in loaded
+                      if d.name != keep and d.dataset.connector is None]
+        if self.idle is not None:
+            for dataset in [d for d in candidates if now - d.last_used > self.idle]:
+                self.unload(dataset.name)
+                candidates.remove(dataset)
+        if self.max_bytes is not None:
+            while candidates and self.nbytes() > self.max_bytes:
+                self.unload(candidates.pop(0).name)
+
+
+def datasets_from_config(path):
+    """
+    :class:`Dataset` of every entry of a JSON config file: ``name``,
+    ``speeds`` (``.h5``/``.parquet`` speed matrix), ``locations`` (CSV with
+    ``lat``/``lon`` per sensor position) and optionally ``title``, ``key``
+    (HDF5 key) and ``graph`` (CSV of ``source``/``target`` sensor positions,
+    nearest neighbours by default)
+    """
+    with open(path) as fh:
+        entries = json.load(fh)
+
+    datasets = []
+    for entry in entries:
+        speeds, key = entry["speeds"], entry.get("key", "df")
+        locations, graph = entry["locations"], entry.get("graph")
+
+        def read_locations(locations=locations):
+            return pd.read_csv(locations)[["lat", "lon"]].rename_axis("sensor")
+
+        def read_graph(graph=graph, locations=locations):
+            return edge_list_graph(pd.read_csv(graph), len(pd.read_csv(locations)))
+
+        datasets.append(Dataset(
+            entry["name"],
+            speeds=lambda speeds=speeds, key=key: read_speed_matrix(speeds, key),
+            locations=read_locations,
+            elements=read_graph if graph else None,
+            title=entry.get("title"),
+        ))
+    return datasets
@@ -0,0 +1,236 @@
+"""
+Publish/subscribe between the processes of one host.
+
+Each Dash worker and each ingestion process that joins the bus binds a Unix
+datagram socket in a shared directory. Publishing sends one small JSON
+datagram to every other socket found there, and a listener thread hands the
+events it receives to the callbacks subscribed to their topic. Delivery is
+best effort: events to peers that are gone or not keeping up are dropped, so
+subscribers must treat events as hints to refresh, never as the data itself.
+"""
+
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+_logger = logging.getLogger(__name__)
+
+#: New rows were ingested: ``version``, ``first``, ``last``
+DATA_VERSION = "data-version"
+#: A session's graph was edited: ``session``
+GRAPH_EDIT = "graph-edit"
+
+# Keeps every datagram well below the default socket buffer size
+MAX_EVENT_BYTES = 16384
+
+
+class EventBus(ABC):
+    """Topics and their subscribers, events come from other processes"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+
+    def subscribe(self, topic, callback):
+        """Call ``callback(payload)`` for every ``topic`` event of another process"""
+        self._subscribers[topic].append(callback)
+        return callback
+
+    def unsubscribe(self, topic, callback):
+        self._subscribers[topic].remove(callback)
+
+    def deliver(self, topic, payload):
+        for callback in list(self._subscribers.get(topic, ())):
+            try:
+                callback(payload)
+            except Exception:  # noqa: BLE001
+                _logger.exception("Event subscriber %r failed on %s", callback, topic)
+
+    @abstractmethod
+    def publish(self, topic, **payload):
+        """Announce ``topic`` with JSON serializable ``payload`` to other processes"""
+        raise NotImplementedError
+
+    def start(self):
+        """Start receiving events"""
+
+    def stop(self):
+        """Stop receiving events"""
+
+
+class NullEventBus(EventBus):
+    """Bus of a single process: there is nobody to tell"""
+
+    def publish(self, topic, **payload):
+        pass
+
+
+class SocketEventBus(EventBus):
+    """
+    Bus over Unix datagram sockets in ``directory``
+
+    Args:
+      directory (str): shared by every process on the bus
+      name (str): socket name of this process, unique by default
+    """
+
+    def __init__(self, directory, name=None):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.name = name or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(directory, f"{self.name}.sock")
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._receiver = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def peers(self):
+        """Socket paths of the other processes on the bus"""
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".sock") and name != f"{self.name}.sock"]
+
+    def publish(self, topic, **payload):
+        data = json.dumps({"topic": topic, "sender": self.name,
+                           "payload": payload}).encode()
+        if len(data) > MAX_EVENT_BYTES:
+            raise ValueError(f"Event of {len(data)} bytes exceeds {MAX_EVENT_BYTES}")
+        for peer in self.peers():
+            try:
+                self._sender.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nobody listens there anymore
+                try:
+                    os.remove(peer)
+                except FileNotFoundError:
+                    pass
+            except OSError as ex:
+                if ex.errno not in (errno.EAGAIN, errno.ENOBUFS):
+                    raise
+                _logger.warning("Dropped %s event for %s, its queue is full",
+                                topic, peer)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.bind(self.path)
+        self._receiver.settimeout(0.2)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="events", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                data = self._receiver.recv(MAX_EVENT_BYTES)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                event = json.loads(data)
+                topic, payload = event["topic"], event["payload"]
+                payload["sender"] = event["sender"]
+            except (ValueError, KeyError, TypeError):
+                _logger.warning("Ignored malformed event %r", data[:100])
+                continue
+            self.deliver(topic, payload)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._receiver is not None:
+            self._receiver.close()
+            self._receiver = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Debouncer:
+    """
+    Hand events to ``callback(payload)`` at most once per ``delay`` seconds
+    per key, on a timer thread rather than the bus listener. Events arriving
+    in the meantime are folded into the pending one with
+    ``merge(pending, payload)``, the latest one wins by default.
+
+    Args:
+      callback (callable): handles the folded payload
+      delay (float): seconds an event waits for more of the same key
+      key (callable): key of a payload, one for all by default
+      merge (callable): folds two payloads
+    """
+
+    def __init__(self, callback, delay=1.0, key=None, merge=None):
+        self.callback = callback
+        self.delay = delay
+        self.key = key or (lambda payload: None)
+        self.merge = merge or (lambda pending, payload: payload)
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, payload):
+        key = self.key(payload)
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = self.merge(self._pending[key], payload)
+                return
+            self._pending[key] = payload
+            timer = self._timers[key] = threading.Timer(self.delay, self._flush, (key,))
+            timer.daemon = True
+            timer.start()
+
+    def _flush(self, key):
+        with self._lock:
+            payload = self._pending.pop(key, None)
+            self._timers.pop(key, None)
+        if payload is None:
+            return
+        try:
+            self.callback(payload)
+        except Exception:  # noqa: BLE001
+            _logger.exception("Debounced subscriber %r failed", self.callback)
+
+    def cancel(self):
+        """Drop the pending events"""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._pending.clear()
+
+
+def announce_appends(store, bus, **tags):
+    """
+    Publish a :data:`DATA_VERSION` event after every append to ``store``,
+    with ``tags`` (e.g. the dataset name) added to the payload
+    """
+
+    def announce(version, first, last):
+        bus.publish(DATA_VERSION, version=version, first=str(first), last=str(last),
+                    **tags)
+
+    return store.subscribe(announce)
+
+
+def bus_from_env():
+    """
+    :class:`SocketEventBus` in ``DASHBOARD_EVENT_DIR`` when set, otherwise a
+    :class:`NullEventBus`
+    """
+    directory = os.getenv("DASHBOARD_EVENT_DIR")
+    if directory:
+        return SocketEventBus(directory)
+    return NullEventBus()
@@ -0,0 +1,216 @@
+"""
+Bulk export of the data behind the charts.
+
+:func:`register_export` adds an ``/export`` route to the Flask server that
+streams the rows selected by a filter as CSV or Parquet. The response is
+generated one storage chunk at a time from the
+:class:`~dashboard.ingestion.SpeedStore`, so exporting a long range for every
+sensor never holds the whole result in memory.
+
+Query parameters, all optional:
+
+- ``session``: take the filters below from the time series chart of a
+  dashboard session: its range, aggregation and sensor, every sensor while
+  it shows their mean. Explicit parameters still win.
+- ``start``, ``end``: date range, an end date includes the whole day
+- ``sensors``: comma separated sensor positions, all sensors by default
+- ``aggregation``: pandas frequency to average over, raw rows by default
+- ``format``: ``csv`` (default) or ``parquet``
+- ``dataset``: which dataset to export when the route serves several
+"""
+
+import io
+
+import flask
+import pandas as pd
+
+from dashboard.ingestion import day_range
+
+
+class ExportError(ValueError):
+    """Invalid export request"""
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file object whose content is drained after every write"""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _bin_sums(frame, freq, origin):
+    """Per-bin sums and counts of the non-missing values of every column"""
+    bins = frame.astype("float64").resample(freq, origin=origin)
+    return bins.sum(), bins.count()
+
+
+def iter_aggregated(frames, freq, origin):
+    """
+    Average chunked ``frames`` per ``freq`` bin, like ``resample().mean()``
+    over all of them, bins without rows included. Only the sums and counts
+    of the last bin of a chunk are carried over to the next one, so a bin
+    spanning chunks (a month, a year) is exact without holding its rows.
+    """
+    carry = None
+    for frame in frames:
+        if frame.empty:
+            continue
+        dtype = frame.dtypes.iloc[0]
+        sums, counts = _bin_sums(frame, freq, origin)
+        if carry is not None:
+            # Resampling the bin labels merges the carried bin with the first
+            # one of the chunk and adds the empty bins between them
+            sums = pd.concat([carry[0], sums]).resample(freq, origin=origin).sum()
+            counts = pd.concat([carry[1], counts]).resample(freq, origin=origin).sum()
+        carry = sums.iloc[-1:], counts.iloc[-1:], dtype
+        if len(sums) > 1:
+            done = counts.iloc[:-1]
+            yield (sums.iloc[:-1] / done.where(done > 0)).astype(dtype)
+    if carry is not None:
+        sums, counts, dtype = carry
+        yield (sums / counts.where(counts > 0)).astype(dtype)
+
+
+def iter_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(header=header, index_label="timestamp").encode()
+        header = False
+
+
+def iter_parquet(frames, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("timestamp", pa.timestamp("ns"))]
+                       + [(str(c), pa.float32()) for c in columns])
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for frame in frames:
+            frame = frame.astype("float32")
+            frame.columns = frame.columns.astype(str)
+            table = pa.Table.from_pandas(frame.rename_axis("timestamp").reset_index(),
+                                         schema=schema, preserve_index=False)
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parse_filters(args, store, defaults=None):
+    """
+    Validated ``(start, end, sensors, aggregation)`` from request ``args``,
+    falling back to ``defaults`` (a session's filters), where ``node_id``
+    stands for ``sensors`` as in the time series chart
+    """
+    filters = dict(defaults or {})
+    filters.update({k: v for k, v in args.items() if v not in (None, "")})
+
+    try:
+        start, end = day_range(filters.get("start"), filters.get("end"))
+    except ValueError as ex:
+        raise ExportError(f"Invalid date: {ex}") from ex
+
+    sensors = filters.get("sensors")
+    if sensors is None and filters.get("node_id") is not None:
+        # The chart shows one sensor, or the mean of all when node_id is -1
+        try:
+            node_id = int(filters["node_id"])
+        except (TypeError, ValueError):
+            node_id = -1
+        sensors = [node_id] if 0 <= node_id < len(store.columns) else None
+    if isinstance(sensors, str):
+        sensors = [s for s in sensors.split(",") if s]
+    if not sensors or "ALL" in sensors:
+        sensors = None
+    else:
+        try:
+            positions = [int(s) for s in sensors]
+        except ValueError as ex:
+            raise ExportError(f"Invalid sensors: {sensors}") from ex
+        if not all(0 <= p < len(store.columns) for p in positions):
+            raise ExportError(f"Sensor positions must be below {len(store.columns)}")
+        sensors = list(store.columns[positions])
+
+    aggregation = filters.get("aggregation") or None
+    if aggregation:
+        try:
+            pd.tseries.frequencies.to_offset(aggregation)
+        except ValueError as ex:
+            raise ExportError(f"Invalid aggregation: {aggregation}") from ex
+    return start, end, sensors, aggregation
+
+
+def export_frames(store, start=None, end=None, sensors=None, aggregation=None):
+    """Generator of the exported DataFrames, one per storage chunk"""
+    frames = store.iter_frames(start, end, sensors)
+    if aggregation:
+        origin = (start or store.first or pd.Timestamp(0)).floor("D")
+        frames = iter_aggregated(frames, aggregation, origin)
+    return frames
+
+
+def register_export(server, store, sessions=None, route="/export"):
+    """
+    Serve exports of ``store`` on ``route``
+
+    Args:
+      server (flask.Flask): usually ``app.server``
+      store: the :class:`SpeedStore` to export, or a callable returning the
+        store of a dataset name (``None`` for the default one)
+      sessions (SessionStore): resolves the ``session`` parameter
+    """
+
+    def export():
+        args = flask.request.args
+        defaults = {}
+        if sessions is not None and args.get("session"):
+            state = sessions.get(args["session"])
+            defaults = state.filters if state is not None else {}
+        source = store
+        if callable(store):
+            try:
+                source = store(args.get("dataset") or defaults.get("dataset"))
+            except KeyError:
+                flask.abort(404, description="Unknown dataset")
+        try:
+            start, end, sensors, aggregation = parse_filters(
+                {k: args.get(k) for k in ("start", "end", "sensors", "aggregation")},
+                source, defaults)
+        except ExportError as ex:
+            flask.abort(400, description=str(ex))
+
+        fmt = args.get("format", "csv")
+        columns = source.columns if sensors is None else pd.Index(sensors)
+        frames = export_frames(source, start, end, sensors, aggregation)
+        if fmt == "csv":
+            body, mimetype = iter_csv(frames), "text/csv"
+        elif fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                flask.abort(501, description="Parquet export requires pyarrow")
+            body = iter_parquet(frames, columns)
+            mimetype = "application/vnd.apache.parquet"
+        else:
+            flask.abort(400, description=f"Unsupported format: {fmt}")
+
+        return flask.Response(
+            flask.stream_with_context(body),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=speeds.{fmt}"},
+        )
+
+    server.add_url_rule(route, "export", export)
+    return export
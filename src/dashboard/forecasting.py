@@ -0,0 +1,193 @@
+"""
+Forecasting service for the speed matrix.
+
+Models implement :class:`BaseForecaster` and are run by a
+:class:`ForecastService` on a schedule, batched over all sensors at once.
+Results are cached by ``(model version, timestamp)`` so dashboard callbacks
+only ever read precomputed forecasts and never execute a model themselves.
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dashboard.instrumentation import record_cache
+
+_logger = logging.getLogger(__name__)
+
+
+class BaseForecaster(ABC):
+    """CPU-only model interface: ``(T, N)`` history in, ``(horizon, N)`` out"""
+
+    version = "base"
+    horizon = 12
+
+    @abstractmethod
+    def predict(self, history):
+        """
+        Args:
+          history (np.ndarray): ``(T, N)`` float array, one column per sensor
+
+        Returns:
+          np.ndarray: ``(horizon, N)`` predicted values
+        """
+        raise NotImplementedError
+
+
+class HistoricalAverageForecaster(BaseForecaster):
+    """
+    Predict each future step as the mean of the same time-of-day slot over
+    the previous ``days`` days.
+    """
+
+    def __init__(self, horizon=12, steps_per_day=288, days=7):
+        self.horizon = horizon
+        self.steps_per_day = steps_per_day
+        self.days = days
+        self.version = f"historical-average-{days}d"
+
+    def predict(self, history):
+        history = np.asarray(history, dtype=np.float32)
+        n_steps = history.shape[0]
+        # (days, horizon) positions of the same slot on previous days
+        offsets = np.arange(1, self.days + 1)[:, None] * self.steps_per_day
+        positions = n_steps + np.arange(self.horizon)[None, :] - offsets
+        samples = history[positions.clip(0)]
+        samples[positions < 0] = np.nan
+
+        counts = (~np.isnan(samples)).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nansum(samples, axis=0) / counts
+        # Not enough history (or only gaps) for a slot: repeat the last value
+        return np.where(counts > 0, means, history[-1])
+
+
+class OnnxForecaster(BaseForecaster):
+    """
+    Run a small ONNX model on CPU. The model takes a ``(1, window, N)``
+    float32 input and returns ``(1, horizon, N)``.
+    """
+
+    def __init__(self, path, window=12, horizon=12, version=None):
+        try:
+            import onnxruntime
+        except ImportError as ex:  # pragma: no cover
+            raise ImportError("OnnxForecaster requires the onnxruntime package") from ex
+        self._session = onnxruntime.InferenceSession(
+            str(path), providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+        self.window = window
+        self.horizon = horizon
+        self.version = version or f"onnx-{path}"
+
+    def predict(self, history):
+        batch = np.asarray(history[-self.window:], dtype=np.float32)[None, ...]
+        (output,) = self._session.run(None, {self._input: batch})
+        return output[0, :self.horizon]
+
+
+class ForecastService:
+    """
+    Run ``forecaster`` over the frame returned by ``source`` and cache the
+    results.
+
+    Args:
+      forecaster (BaseForecaster): model to run
+      source (callable): returns the history as a ``(time, sensor)`` DataFrame
+        with a regular DatetimeIndex
+      interval (float): seconds between scheduled refreshes
+      maxsize (int): number of forecasts kept in the cache
+    """
+
+    def __init__(self, forecaster, source, interval=300, maxsize=8):
+        self.forecaster = forecaster
+        self.source = source
+        self.interval = interval
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """
+        Forecast from the current history unless it is already cached.
+        Returns ``None`` while there are fewer than two rows of history, e.g.
+        before a replay delivered any.
+        """
+        history = self.source()
+        if len(history) < 2:
+            return None
+        timestamp = history.index[-1]
+        key = (self.forecaster.version, timestamp)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._latest = key
+                return self._cache[key]
+
+        values = self.forecaster.predict(history.to_numpy())
+        step = history.index.freq or (history.index[-1] - history.index[-2])
+        index = pd.date_range(timestamp + step, periods=len(values), freq=step)
+        forecast = pd.DataFrame(values, index=index, columns=history.columns)
+
+        with self._lock:
+            self._cache[key] = forecast
+            self._latest = key
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        _logger.debug("Forecast %s computed for %d sensors", key, history.shape[1])
+        return forecast
+
+    def get(self, timestamp, version=None):
+        """Cached forecast issued at ``timestamp``, or ``None``"""
+        with self._lock:
+            forecast = self._cache.get((version or self.forecaster.version, timestamp))
+        record_cache(forecast is not None, cache="forecast")
+        return forecast
+
+    def latest(self):
+        """Most recent cached forecast, or ``None`` if nothing ran yet"""
+        with self._lock:
+            forecast = self._cache.get(self._latest) if self._latest else None
+        record_cache(forecast is not None, cache="forecast")
+        return forecast
+
+    @property
+    def nbytes(self):
+        """Memory held by the cached forecasts"""
+        with self._lock:
+            return int(sum(f.memory_usage().sum() for f in self._cache.values()))
+
+    def invalidate(self):
+        """Drop every cached forecast"""
+        with self._lock:
+            self._cache.clear()
+            self._latest = None
+
+    def start(self):
+        """Refresh every ``interval`` seconds in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="forecast", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:  # noqa: BLE001
+                _logger.exception("Scheduled forecast failed")
+            self._stopped.wait(self.interval)
@@ -0,0 +1,249 @@
+"""
+Compact sensor networks.
+
+Cytoscape wants every node and edge as a ``{"data": {...}}`` dict. Holding
+a large network in that form makes every load and edit churn through
+thousands of dicts. A :class:`CompactGraph` numbers nodes ``0..n-1`` and
+keeps edges as parallel arrays of node numbers, with the other element data
+in one column per attribute. Elements are numbered nodes first, then edges.
+Dicts are only built at the boundary, by :meth:`CompactGraph.to_elements`
+for the elements actually sent to a client. The full list, which every page
+load gets, is built once.
+
+:func:`diff` finds the minimal sets of elements to remove and add between two
+views of a graph. :func:`encode_diff` turns those sets into a
+:class:`dash.Patch` for the client list, or into the full list when that is
+smaller or the client's list is not known to be the one the patch applies
+to (see :func:`mask_digest`).
+"""
+
+import hashlib
+import sys
+
+import numpy as np
+from dash import Patch
+
+
+def _columns(rows, skip):
+    """Values of every key of ``rows`` (dicts) but ``skip``, ``None`` where missing"""
+    columns = {}
+    for i, row in enumerate(rows):
+        for key, value in row.items():
+            if key not in skip:
+                if key not in columns:
+                    columns[key] = [None] * len(rows)
+                columns[key][i] = value
+    return columns
+
+
+class CompactGraph:
+    """
+    Network of ``nodes`` nodes and ``len(source)`` edges
+
+    Args:
+      nodes (int): number of nodes
+      source (numpy.ndarray): node number of the source of every edge, -1 for
+        a node that is not in the graph
+      target (numpy.ndarray): node number of the target of every edge
+      ids (list): Cytoscape id of every node, ``str(number)`` by default
+      node_data (dict): other data of the nodes, one list per attribute
+      edge_data (dict): other data of the edges, one list per attribute
+      dangling (dict): ``(source id, target id)`` of edges with an endpoint
+        that is not in the graph, by edge number
+    """
+
+    __slots__ = ("nodes", "source", "target", "ids", "node_data", "edge_data",
+                 "dangling", "_position", "_elements", "_nbytes", "_fingerprint")
+
+    def __init__(self, nodes, source, target, ids=None, node_data=None, edge_data=None,
+                 dangling=None):
+        self.nodes = nodes
+        self.source = np.asarray(source, dtype=np.int64)
+        self.target = np.asarray(target, dtype=np.int64)
+        self.ids = ids
+        self.node_data = node_data or {}
+        self.edge_data = edge_data or {}
+        self.dangling = dangling or {}
+        self._position = {i: p for p, i in enumerate(ids)} if ids is not None else None
+        self._elements = None
+        self._nbytes = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_elements(cls, elements):
+        """Graph of a Cytoscape element list. Only the ``data`` of elements is kept."""
+        nodes = [e["data"] for e in elements if "source" not in e["data"]]
+        edges = [e["data"] for e in elements if "source" in e["data"]]
+        ids = [str(data["id"]) for data in nodes]
+        position = {i: p for p, i in enumerate(ids)}
+        source = np.fromiter((position.get(str(e["source"]), -1) for e in edges),
+                             dtype=np.int64, count=len(edges))
+        target = np.fromiter((position.get(str(e["target"]), -1) for e in edges),
+                             dtype=np.int64, count=len(edges))
+        dangling = {int(i): (edges[i]["source"], edges[i]["target"])
+                    for i in np.flatnonzero((source < 0) | (target < 0))}
+        if ids == [str(p) for p in range(len(ids))]:
+            ids = None
+        return cls(len(nodes), source, target, ids=ids,
+                   node_data=_columns(nodes, ("id",)),
+                   edge_data=_columns(edges, ("source", "target")), dangling=dangling)
+
+    @classmethod
+    def from_edges(cls, nodes, source, target, labels=None):
+        """
+        Graph of ``nodes`` nodes with ids ``"0"..."n-1"`` linked by the edges
+        ``source[i] -> target[i]``, which must all be node numbers
+        """
+        return cls(nodes, source, target,
+                   node_data={"label": list(labels)} if labels is not None else None)
+
+    def __len__(self):
+        """Number of elements"""
+        return self.nodes + len(self.source)
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays, the attribute columns and the full element list"""
+        if self._nbytes is None:
+            total = self.source.nbytes + self.target.nbytes
+            columns = list(self.node_data.values()) + list(self.edge_data.values())
+            if self.ids is not None:
+                columns.append(self.ids)
+            for column in columns:
+                total += sys.getsizeof(column) + sum(map(sys.getsizeof, column))
+            if self._elements is not None:
+                total += sum(sys.getsizeof(e) + sys.getsizeof(e["data"])
+                             for e in self._elements)
+            self._nbytes = total
+        return self._nbytes
+
+    @property
+    def fingerprint(self):
+        """
+        Digest of the element positions: graphs with the same fingerprint
+        number their nodes and edges the same way
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(np.int64(self.nodes).tobytes())
+            digest.update(self.source.tobytes())
+            digest.update(self.target.tobytes())
+            if self.ids is not None:
+                digest.update("\0".join(self.ids).encode())
+            digest.update(repr(sorted(self.dangling.items())).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def node_id(self, node):
+        return self.ids[node] if self.ids is not None else str(node)
+
+    def positions(self, ids):
+        """Node numbers of the ``ids`` that are in the graph"""
+        if self._position is not None:
+            found = [self._position[i] for i in map(str, ids) if i in self._position]
+        else:
+            found = [int(i) for i in map(str, ids)
+                     if i.isdigit() and int(i) < self.nodes and str(int(i)) == i]
+        return np.asarray(found, dtype=np.int64)
+
+    def node_mask(self, ids):
+        """
+        Mask over node numbers with the nodes ``ids`` set, plus one extra
+        always-False slot so that endpoints -1 read False
+        """
+        mask = np.zeros(self.nodes + 1, dtype=bool)
+        mask[self.positions(ids)] = True
+        return mask
+
+    def _node_ids(self, nodes):
+        if self.ids is None:
+            return list(map(str, nodes))
+        return [self.ids[node] for node in nodes]
+
+    @staticmethod
+    def _add_columns(rows, columns, positions):
+        for key, column in columns.items():
+            for data, position in zip(rows, positions):
+                value = column[position]
+                if value is not None:
+                    data[key] = value
+
+    def to_elements(self, positions=None):
+        """
+        Cytoscape elements at element ``positions`` (sorted), all by default.
+        The full list is shared between callers, do not modify it.
+        """
+        if positions is None or len(positions) == len(self):
+            if self._elements is None:
+                self._elements = self._build(np.arange(len(self)))
+                self._nbytes = None
+            return self._elements
+        if self._elements is not None:
+            return [self._elements[i] for i in np.asarray(positions).tolist()]
+        return self._build(np.asarray(positions, dtype=np.int64))
+
+    def _build(self, positions):
+        split = int(np.searchsorted(positions, self.nodes))
+        nodes = positions[:split].tolist()
+        node_rows = [{"id": i} for i in self._node_ids(nodes)]
+        self._add_columns(node_rows, self.node_data, nodes)
+
+        edges = (positions[split:] - self.nodes).tolist()
+        edge_rows = [{"source": s, "target": t} for s, t in
+                     zip(self._node_ids(self.source[edges].tolist()),
+                         self._node_ids(self.target[edges].tolist()))]
+        if self.dangling:
+            for data, edge in zip(edge_rows, edges):
+                if edge in self.dangling:
+                    data["source"], data["target"] = self.dangling[edge]
+        self._add_columns(edge_rows, self.edge_data, edges)
+        return [{"data": data} for data in node_rows + edge_rows]
+
+
+def mask_digest(graph, mask):
+    """
+    Digest of the elements of ``graph`` shown by ``mask``: clients keep it
+    as the version of their element list
+    """
+    digest = hashlib.blake2b(graph.fingerprint.encode(), digest_size=8)
+    digest.update(np.packbits(mask).tobytes())
+    return digest.hexdigest()
+
+
+def diff(before, after):
+    """
+    Minimal change between two masks of shown elements
+
+    Returns:
+      tuple: element positions to remove and to add
+    """
+    return np.flatnonzero(before & ~after), np.flatnonzero(after & ~before)
+
+
+def encode_diff(graph, before, after, base):
+    """
+    Update of a client showing the elements ``before`` (a mask over element
+    positions) to show ``after``: a :class:`dash.Patch` deleting the removed
+    elements and inserting the added ones, or the full list when that is
+    smaller. Inserts carry an element, deletes only a position.
+
+    Positions are only right for a client showing exactly ``before``, so the
+    full list is also sent unless ``base``, the version the client's list was
+    sent with, is :func:`mask_digest` of ``before``.
+    """
+    if base != mask_digest(graph, before):
+        return graph.to_elements(np.flatnonzero(after))
+    removed, added = diff(before, after)
+    shown = int(np.count_nonzero(after))
+    if 2 * len(added) + len(removed) > shown:
+        return graph.to_elements(np.flatnonzero(after))
+
+    patch = Patch()
+    # Client positions are ranks among shown elements: delete back to front,
+    # then insert front to back at the rank in the new list
+    for position in (np.cumsum(before)[removed] - 1)[::-1].tolist():
+        del patch[position]
+    ranks = (np.cumsum(after)[added] - 1).tolist()
+    for rank, element in zip(ranks, graph.to_elements(added)):
+        patch.insert(rank, element)
+    return patch
@@ -0,0 +1,334 @@
+"""
+Sensor by time speed heatmap served as a tile pyramid.
+
+Plotting every ``(sensor, 5 minutes)`` cell of a long range through plotly
+does not scale, so the heatmap is rendered server side into 256 x 256 pixel
+PNG tiles. Level 0 has one pixel per time step, every level above averages
+twice as many steps per pixel, up to the level where the whole store fits in
+one tile wide. Rows are sensors, optionally ordered along corridors with
+:func:`corridor_order` so neighbouring rows are neighbouring sensors.
+
+Tiles are cached on disk. Tiles whose time span is complete never change;
+tiles touched by rows appended to the store are dropped and rendered again on
+their next request.
+"""
+
+import math
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+import flask
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from dashboard.animation import MISSING, bucket_colors, encode_speeds
+from dashboard.instrumentation import record_cache
+
+TILE = 256
+
+
+def encode_png(rgba):
+    """PNG file of an ``(height, width, 4)`` ``uint8`` array"""
+    height, width, _ = rgba.shape
+    # Filter type 0 (none) in front of every scanline
+    raw = np.concatenate([np.zeros((height, 1), np.uint8),
+                          np.ascontiguousarray(rgba, np.uint8).reshape(height, -1)],
+                         axis=1)
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data
+                + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def color_table(buckets=64):
+    """RGBA color of every speed bucket, missing readings are transparent"""
+    from plotly.colors import unlabel_rgb
+
+    table = np.zeros((MISSING + 1, 4), dtype=np.uint8)
+    for bucket, color in enumerate(bucket_colors(buckets)):
+        table[bucket, :3] = unlabel_rgb(color)
+        table[bucket, 3] = 255
+    return table
+
+
+def corridor_order(locations):
+    """
+    Sensor order walking from the westernmost sensor to the nearest sensor
+    not visited yet, so that sensors along a corridor end up in adjacent rows
+
+    Args:
+      locations (pandas.DataFrame): ``lat``/``lon`` per sensor position
+
+    Returns:
+      numpy.ndarray: sensor positions in row order
+    """
+    points = locations[["lon", "lat"]].to_numpy(dtype=np.float64)
+    visited = np.zeros(len(points), dtype=bool)
+    order = np.empty(len(points), dtype=np.int64)
+    current = int(np.argmin(points[:, 0])) if len(points) else 0
+    for i in range(len(points)):
+        order[i] = current
+        visited[current] = True
+        distance = np.sum((points - points[current]) ** 2, axis=1)
+        distance[visited] = np.inf
+        current = int(np.argmin(distance))
+    return order
+
+
+class TilePyramid:
+    """
+    Heatmap tiles of a :class:`~dashboard.ingestion.SpeedStore`
+
+    Args:
+      store (SpeedStore): speeds to render
+      directory (str): tile cache, a temporary directory removed by
+        :meth:`close` by default
+      freq (str): time step of level 0
+      order: sensor positions in row order, store order by default
+      vmax (float): speed at the top of the color scale
+      buckets (int): number of colors
+      origin: start of the first tile column, rounded down to the day. By
+        default the first stored reading, taken when it arrives if the store
+        is still empty.
+    """
+
+    def __init__(self, store, directory=None, freq="5min", order=None, vmax=70.0,
+                 buckets=64, origin=None):
+        self.store = store
+        self.step = to_offset(freq).nanos
+        self.order = (np.arange(len(store.columns)) if order is None
+                      else np.asarray(order))
+        self.vmax = vmax
+        self.buckets = buckets
+        self.colors = color_table(buckets)
+
+        self._temporary = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="heatmap-")
+        self._base = directory
+        self._origin = None
+        self.directory = None
+
+        # Invalidation count when each tile column was last invalidated, so a
+        # render that raced with an invalidation is not cached
+        self._generation = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+        if origin is not None:
+            self._set_origin(pd.Timestamp(origin))
+        # Tiles of a previous run reaching past the data are not trusted
+        if store.last is not None:
+            self.invalidate(store.last, None)
+        store.subscribe(self._appended)
+
+    def close(self):
+        """Stop following the store and remove a temporary tile cache"""
+        try:
+            self.store.unsubscribe(self._appended)
+        except ValueError:
+            pass
+        if self._temporary:
+            shutil.rmtree(self._base, ignore_errors=True)
+
+    def _set_origin(self, first):
+        with self._lock:
+            if self._origin is not None:
+                return
+            origin = first.floor("D")
+            # Tiles depend on the time origin and the row order
+            key = f"{origin:%Y%m%dT%H%M}-{zlib.crc32(self.order.tobytes()):08x}"
+            self.directory = os.path.join(self._base, key)
+            os.makedirs(self.directory, exist_ok=True)
+            self._origin = origin
+
+    @property
+    def origin(self):
+        """Start of tile column 0, ``None`` until there is data"""
+        if self._origin is None and self.store.first is not None:
+            self._set_origin(self.store.first)
+        return self._origin
+
+    @property
+    def rows(self):
+        """Number of tile rows"""
+        return math.ceil(len(self.order) / TILE)
+
+    @property
+    def max_level(self):
+        """Coarsest level, where every step so far fits in one tile"""
+        if self.store.last is None or self.origin is None:
+            return 0
+        steps = (self.store.last.value - self.origin.value) // self.step + 1
+        return max(0, math.ceil(math.log2(steps / TILE)))
+
+    def width(self, level):
+        """Time covered by one pixel at ``level``, in nanoseconds"""
+        return self.step << level
+
+    def span(self, level, col):
+        """Time range ``[start, end)`` of the tiles in column ``col``"""
+        start = self.origin + pd.Timedelta(col * TILE * self.width(level))
+        return start, start + pd.Timedelta(TILE * self.width(level))
+
+    def column(self, level, time):
+        offset = pd.Timestamp(time).value - self.origin.value
+        return offset // (TILE * self.width(level))
+
+    def level_for(self, start, end, pixels=1024):
+        """Finest level showing ``start`` to ``end`` in about ``pixels`` pixels"""
+        span = pd.Timestamp(end).value - pd.Timestamp(start).value
+        steps = max(span / self.step, 1)
+        return int(min(max(math.ceil(math.log2(steps / pixels)), 0), self.max_level))
+
+    def visible(self, start, end, pixels=1024):
+        """
+        Level and ``(row, col)`` of the tiles covering ``start`` to ``end``
+        """
+        level = self.level_for(start, end, pixels)
+        first = max(self.column(level, start), 0)
+        last = self.column(level, end)
+        return level, [(row, col) for row in range(self.rows)
+                       for col in range(first, last + 1)]
+
+    def _path(self, level, row, col):
+        return os.path.join(self.directory, str(level), str(row), f"{col}.png")
+
+    def _appended(self, version, first, last):
+        self.invalidate(first, last)
+
+    def invalidate(self, first, last=None):
+        """Forget tiles overlapping ``first`` to ``last`` (or later)"""
+        if self.origin is None:
+            # Nothing rendered yet
+            return
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        for level in range(self.max_level + 1):
+            lo = self.column(level, first)
+            hi = (self.column(level, last) if last is not None
+                  else self._last_column(level))
+            for col in range(lo, hi + 1):
+                with self._lock:
+                    self._touched[level, col] = generation
+                for row in range(self.rows):
+                    try:
+                        os.remove(self._path(level, row, col))
+                    except FileNotFoundError:
+                        pass
+
+    def _last_column(self, level):
+        cols = [int(name[:-4]) for row in range(self.rows)
+                for name in _listdir(os.path.join(self.directory, str(level), str(row)))
+                if name.endswith(".png")]
+        return max(cols, default=-1)
+
+    def render(self, level, row, col):
+        """RGBA pixels of a tile, sensors down and time across"""
+        start, end = self.span(level, col)
+        sensors = self.order[row * TILE:(row + 1) * TILE]
+        sums = np.zeros((TILE, len(sensors)))
+        counts = np.zeros((TILE, len(sensors)), dtype=np.int64)
+        for frame in self.store.iter_frames(start, end - pd.Timedelta(1),
+                                            self.store.columns[sensors]):
+            if frame.empty:
+                continue
+            values = frame.to_numpy()
+            bins = (frame.index.asi8 - start.value) // self.width(level)
+            starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+            present = ~np.isnan(values)
+            sums[bins[starts]] += np.add.reduceat(np.where(present, values, 0), starts)
+            counts[bins[starts]] += np.add.reduceat(present.astype(np.int64), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return self.colors[encode_speeds(means.T, self.vmax, self.buckets)]
+
+    def complete(self, level, col):
+        """Whether no more rows can land in tile column ``col``"""
+        last = self.store.last
+        return last is not None and self.span(level, col)[1] <= last
+
+    def tile(self, level, row, col):
+        """PNG bytes of a tile, read from the disk cache when possible"""
+        if self.origin is None:
+            # Nothing stored yet
+            raise IndexError((level, row, col))
+        if not (0 <= level <= self.max_level and 0 <= row < self.rows and col >= 0):
+            raise IndexError((level, row, col))
+        path = self._path(level, row, col)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            record_cache(True, cache="heatmap")
+            return data
+        except FileNotFoundError:
+            record_cache(False, cache="heatmap")
+
+        with self._lock:
+            generation = self._generation
+        data = encode_png(self.render(level, row, col))
+        last = self.store.last
+        if last is None or self.span(level, col)[0] > last:
+            # Nothing there yet
+            return data
+        with self._lock:
+            if self._touched.get((level, col), 0) <= generation:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+        return data
+
+    def clear(self):
+        """Remove every cached tile"""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except FileNotFoundError:
+        return []
+
+
+def register_heatmap(server, pyramid, route="/heatmap"):
+    """
+    Serve the tiles of ``pyramid`` on ``{route}/<level>/<row>/<col>.png``
+
+    Args:
+      server (flask.Flask): usually ``app.server``
+      pyramid: the :class:`TilePyramid` to serve, or a callable returning
+        the pyramid of the ``dataset`` query parameter
+    """
+
+    def tile(level, row, col):
+        try:
+            tiles = (pyramid(flask.request.args.get("dataset")) if callable(pyramid)
+                     else pyramid)
+            data = tiles.tile(level, row, col)
+        except (IndexError, KeyError):
+            flask.abort(404)
+        response = flask.Response(data, mimetype="image/png")
+        if tiles.complete(level, col):
+            response.cache_control.max_age = 86400
+            response.cache_control.public = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    server.add_url_rule(f"{route}/<int:level>/<int:row>/<int:col>.png", "heatmap_tile",
+                        tile)
+    return tile
@@ -0,0 +1,278 @@
+"""
+Ingestion path for the speed matrix.
+
+Connectors append rows to a :class:`SpeedStore`: an append-only, columnar
+in-memory store of ``(timestamp, sensor)`` speeds held in fixed-size chunks.
+The store keeps time rollups up to date incrementally on every append and
+pushes a notification to its subscribers, which is how caches and views
+learn about new data.
+"""
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+_logger = logging.getLogger(__name__)
+
+
+class _Chunk:
+    """Preallocated block of rows"""
+
+    def __init__(self, capacity, width):
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, width), dtype=np.float32)
+        self.size = 0
+
+    @property
+    def full(self):
+        return self.size == len(self.times)
+
+    def fill(self, times, values):
+        """Copy as many rows as fit, returns how many were taken"""
+        taken = min(len(times), len(self.times) - self.size)
+        self.times[self.size:self.size + taken] = times[:taken]
+        self.values[self.size:self.size + taken] = values[:taken]
+        self.size += taken
+        return taken
+
+
+class Rollup:
+    """
+    Running per-bin sums and counts of every sensor for a fixed frequency,
+    updated incrementally as rows are appended in time order
+
+    Args:
+      freq (str): fixed pandas frequency, e.g. ``"1h"``
+      width (int): number of sensors
+    """
+
+    def __init__(self, freq, width):
+        self.freq = freq
+        self.step = to_offset(freq).nanos
+        self.width = width
+        self.bins = []
+        self.sums = []
+        self.counts = []
+
+    def add(self, times, values):
+        bins = times - times % self.step
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        present = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(present, values, 0).astype(np.float64), starts)
+        counts = np.add.reduceat(present.astype(np.int64), starts)
+        for bin_, bin_sum, bin_count in zip(bins[starts], sums, counts):
+            if self.bins and self.bins[-1] == bin_:
+                self.sums[-1] += bin_sum
+                self.counts[-1] += bin_count
+            else:
+                self.bins.append(int(bin_))
+                self.sums.append(bin_sum)
+                self.counts.append(bin_count)
+
+    def frame(self, columns, start=None, end=None):
+        """Per-bin means between ``start`` and ``end`` (inclusive)"""
+        bins = np.asarray(self.bins, dtype=np.int64)
+        lo = 0 if start is None else np.searchsorted(bins, _ns(start), side="left")
+        hi = len(bins) if end is None else np.searchsorted(bins, _ns(end), side="right")
+        sums = np.asarray(self.sums[lo:hi]).reshape(-1, self.width)
+        counts = np.asarray(self.counts[lo:hi]).reshape(-1, self.width)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        index = pd.DatetimeIndex(bins[lo:hi].astype("datetime64[ns]"))
+        frame = pd.DataFrame(means, index=index, columns=columns)
+        if len(index):
+            # Bins without rows are missing from the rollup, NaN like resample()
+            frame = frame.reindex(pd.date_range(index[0], index[-1], freq=self.freq))
+        return frame
+
+
+def _ns(value):
+    return pd.Timestamp(value).value
+
+
+def day_range(start, end):
+    """
+    Date range as timestamps, an end given as a date including the whole day
+    """
+    start = pd.Timestamp(start) if start else None
+    if end and len(str(end)) <= 10:
+        end = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1)
+    return start, pd.Timestamp(end) if end else None
+
+
+class SpeedStore:
+    """
+    Append-only columnar store of sensor speeds
+
+    Args:
+      columns: sensor labels, one per column
+      rollups (list): fixed frequencies to maintain rollups for
+      chunk_rows (int): rows per storage chunk
+    """
+
+    def __init__(self, columns, rollups=(), chunk_rows=4096):
+        self.columns = pd.Index(columns)
+        self.chunk_rows = chunk_rows
+        self.rollups = {freq: Rollup(freq, len(self.columns)) for freq in rollups}
+        self.version = 0
+        self._chunks = []
+        self._subscribers = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_frame(cls, frame, **kwargs):
+        """Store seeded with a ``(time, sensor)`` DataFrame"""
+        store = cls(frame.columns, **kwargs)
+        store.append(frame.index, frame.to_numpy())
+        return store
+
+    def __len__(self):
+        return sum(chunk.size for chunk in self._chunks)
+
+    @property
+    def nbytes(self):
+        """Memory held by the chunks and rollups"""
+        with self._lock:
+            chunks = sum(c.times.nbytes + c.values.nbytes for c in self._chunks)
+            # Per bin: one timestamp plus a float64 sum and an int64 count per sensor
+            rollups = sum(len(r.bins) * (8 + 16 * r.width)
+                          for r in self.rollups.values())
+        return chunks + rollups
+
+    @property
+    def first(self):
+        """Timestamp of the oldest row, ``None`` when empty"""
+        with self._lock:
+            if not self._chunks:
+                return None
+            return pd.Timestamp(self._chunks[0].times[0])
+
+    @property
+    def last(self):
+        """Timestamp of the newest row, ``None`` when empty"""
+        with self._lock:
+            if not self._chunks:
+                return None
+            chunk = self._chunks[-1]
+            return pd.Timestamp(chunk.times[chunk.size - 1])
+
+    def subscribe(self, callback):
+        """
+        Call ``callback(version, first, last)`` after every append, with the
+        time range of the appended rows
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def append(self, timestamps, values):
+        """
+        Append rows in time order
+
+        Args:
+          timestamps: ``n`` timestamps, later than anything stored
+          values: ``(n, sensors)`` speeds
+        """
+        times = pd.DatetimeIndex(timestamps).asi8
+        values = np.asarray(values, dtype=np.float32).reshape(len(times), -1)
+        if values.shape[1] != len(self.columns):
+            raise ValueError(
+                f"Expected {len(self.columns)} sensors, got {values.shape[1]}")
+        if not len(times):
+            return self.version
+        if np.any(np.diff(times) <= 0):
+            raise ValueError("Timestamps must be strictly increasing")
+
+        with self._lock:
+            last = self.last
+            if last is not None and times[0] <= last.value:
+                raise ValueError(
+                    f"Rows at {pd.Timestamp(times[0])} are not after {last}")
+            offset = 0
+            while offset < len(times):
+                if not self._chunks or self._chunks[-1].full:
+                    self._chunks.append(_Chunk(self.chunk_rows, len(self.columns)))
+                offset += self._chunks[-1].fill(times[offset:], values[offset:])
+            for rollup in self.rollups.values():
+                rollup.add(times, values)
+            self.version += 1
+            version = self.version
+
+        first, last = pd.Timestamp(times[0]), pd.Timestamp(times[-1])
+        for callback in list(self._subscribers):
+            try:
+                callback(version, first, last)
+            except Exception:  # noqa: BLE001
+                _logger.exception("Store subscriber %r failed", callback)
+        return version
+
+    def _columns(self, sensors):
+        if sensors is None:
+            return slice(None), self.columns
+        positions = self.columns.get_indexer(sensors)
+        if (positions < 0).any():
+            raise KeyError(f"Unknown sensors: {list(pd.Index(sensors)[positions < 0])}")
+        return positions, self.columns[positions]
+
+    @staticmethod
+    def _frame(times, values, columns):
+        index = pd.DatetimeIndex(times.astype("datetime64[ns]"))
+        return pd.DataFrame(values, index=index, columns=columns, copy=True)
+
+    def iter_frames(self, start=None, end=None, sensors=None):
+        """
+        Yield the rows between ``start`` and ``end`` (inclusive) one storage
+        chunk at a time, as DataFrames restricted to the ``sensors`` columns
+        """
+        lo = -np.inf if start is None else _ns(start)
+        hi = np.inf if end is None else _ns(end)
+        positions, columns = self._columns(sensors)
+        with self._lock:
+            chunks = [(c.times[:c.size], c.values[:c.size]) for c in self._chunks]
+        for times, values in chunks:
+            if times[-1] < lo or times[0] > hi:
+                continue
+            a = np.searchsorted(times, lo, "left")
+            b = np.searchsorted(times, hi, "right")
+            yield self._frame(times[a:b], values[a:b, positions], columns)
+
+    def frame(self, start=None, end=None, sensors=None):
+        """Rows between ``start`` and ``end`` as one DataFrame"""
+        frames = list(self.iter_frames(start, end, sensors))
+        if not frames:
+            _, columns = self._columns(sensors)
+            return self._frame(np.empty(0, np.int64),
+                               np.empty((0, len(columns)), np.float32), columns)
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    def tail(self, rows):
+        """Last ``rows`` rows as a DataFrame"""
+        with self._lock:
+            taken, parts = 0, []
+            for chunk in reversed(self._chunks):
+                if taken >= rows:
+                    break
+                size = min(chunk.size, rows - taken)
+                parts.insert(0, (chunk.times[chunk.size - size:chunk.size],
+                                 chunk.values[chunk.size - size:chunk.size]))
+                taken += size
+        if not parts:
+            return self.frame()
+        return self._frame(np.concatenate([t for t, _ in parts]),
+                           np.concatenate([v for _, v in parts]), self.columns)
+
+    def resample(self, freq, start=None, end=None):
+        """
+        Mean per ``freq`` bin between ``start`` and ``end``, read from the
+        maintained rollup when there is one
+        """
+        rollup = self.rollups.get(freq)
+        if rollup is not None:
+            with self._lock:
+                return rollup.frame(self.columns, start, end)
+        return self.frame(start, end).resample(freq).mean()
@@ -0,0 +1,277 @@
+"""
+Per-callback latency instrumentation.
+
+:func:`instrument` patches ``app.callback`` so every callback registered
+afterwards is timed, and serves the collected numbers in the Prometheus text
+format on ``/metrics``. For every callback it records:
+
+- wall time of the callback function itself
+- serialization time, i.e. the time Dash spends turning the result into the
+  JSON response
+- payload size of that response
+- hits and misses of server-side caches consulted while the callback runs
+  (reported by the caches through :func:`record_cache`)
+
+An opt-in :class:`SamplingProfiler` dumps flame-graph compatible (folded)
+stacks of slow callbacks.
+"""
+
+import bisect
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import flask
+from dash.exceptions import PreventUpdate
+
+_logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PAYLOAD_BUCKETS = (1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 100 << 20)
+
+_local = threading.local()
+
+
+def record_cache(hit, cache="default"):
+    """Count a cache lookup against the callback running in this thread"""
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.cache(_local.callback, cache, hit)
+
+
+class _Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self._sums = defaultdict(float)
+
+    def observe(self, label, value):
+        self._counts[label][bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{callback="{label}",le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'{self.name}_sum{{callback="{label}"}} {self._sums[label]}')
+            lines.append(f'{self.name}_count{{callback="{label}"}} {cumulative}')
+        return lines
+
+
+class CallbackMetrics:
+    """Thread-safe store of callback measurements"""
+
+    def __init__(self, prefix="dashboard_callback"):
+        self._lock = threading.Lock()
+        self.duration = _Histogram(
+            f"{prefix}_duration_seconds", "Wall time of the callback function.",
+            DURATION_BUCKETS)
+        self.serialization = _Histogram(
+            f"{prefix}_serialization_seconds",
+            "Time spent serializing the callback response.", DURATION_BUCKETS)
+        self.payload = _Histogram(
+            f"{prefix}_payload_bytes", "Size of the serialized callback response.",
+            PAYLOAD_BUCKETS)
+        self._errors_name = f"{prefix}_errors_total"
+        self._errors = Counter()
+        self._cache_name = f"{prefix}_cache_requests_total"
+        self._cache = Counter()
+
+    def observe(self, callback, duration):
+        with self._lock:
+            self.duration.observe(callback, duration)
+
+    def observe_response(self, callback, serialization, payload):
+        with self._lock:
+            self.serialization.observe(callback, serialization)
+            self.payload.observe(callback, payload)
+
+    def error(self, callback):
+        with self._lock:
+            self._errors[callback] += 1
+
+    def cache(self, callback, cache, hit):
+        with self._lock:
+            self._cache[callback, cache, "hit" if hit else "miss"] += 1
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        with self._lock:
+            lines = self.duration.render() + self.serialization.render()
+            lines += self.payload.render()
+            lines += [f"# HELP {self._errors_name} Callbacks that raised an exception.",
+                      f"# TYPE {self._errors_name} counter"]
+            lines += [f'{self._errors_name}{{callback="{name}"}} {count}'
+                      for name, count in sorted(self._errors.items())]
+            lines += [f"# HELP {self._cache_name} Cache lookups made by callbacks.",
+                      f"# TYPE {self._cache_name} counter"]
+            lines += [
+                f'{self._cache_name}{{callback="{name}",cache="{cache}",'
+                f'result="{result}"}} {count}'
+                for (name, cache, result), count in sorted(self._cache.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of threads running a callback every ``interval``
+    seconds and write them in the folded format understood by
+    ``flamegraph.pl`` and speedscope when the callback took longer than
+    ``threshold`` seconds.
+
+    Args:
+      directory (str): where ``<callback>-<timestamp>.folded`` files go
+      interval (float): seconds between samples
+      threshold (float): minimum callback wall time for a dump
+    """
+
+    def __init__(self, directory, interval=0.005, threshold=1.0):
+        self.directory = directory
+        self.interval = interval
+        self.threshold = threshold
+        self._active = {}
+        self._lock = threading.Lock()
+        # Set while a callback is profiled, the sampler sleeps otherwise
+        self._busy = threading.Event()
+        self._thread = None
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            self._busy.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler",
+                                                daemon=True)
+                self._thread.start()
+
+    def end(self, callback, elapsed):
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if stacks and elapsed >= self.threshold:
+            self.dump(callback, stacks)
+
+    def dump(self, callback, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{callback}-{time.time_ns()}.folded")
+        with open(path, "w") as fh:
+            for stack, count in stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        _logger.info("Slow callback %s: stacks written to %s", callback, path)
+        return path
+
+    def _sample(self):
+        own = threading.get_ident()
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        stacks[_fold(frame)] += 1
+                if not self._active:
+                    self._busy.clear()
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _timed_function(func, name, metrics, profiler):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "metrics", None), getattr(_local, "callback", None)
+        _local.metrics, _local.callback = metrics, name
+        if profiler is not None:
+            profiler.begin()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            metrics.error(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.metrics, _local.callback = previous
+            _local.elapsed = elapsed
+            metrics.observe(name, elapsed)
+            if profiler is not None:
+                profiler.end(name, elapsed)
+
+    return wrapper
+
+
+def _timed_dispatch(dispatch, name, metrics):
+    @functools.wraps(dispatch)
+    def wrapper(*args, **kwargs):
+        _local.elapsed = None
+        start = time.perf_counter()
+        response = dispatch(*args, **kwargs)
+        total = time.perf_counter() - start
+        if _local.elapsed is not None and isinstance(response, str):
+            metrics.observe_response(name, max(total - _local.elapsed, 0.0),
+                                     len(response.encode()))
+        return response
+
+    return wrapper
+
+
+def instrument(app, metrics=None, profiler=None, route="/metrics"):
+    """
+    Time every callback registered on ``app`` from now on and serve the
+    metrics on ``route``. Call it right after creating the app.
+
+    Args:
+      app (dash.Dash): application to instrument
+      metrics (CallbackMetrics): store to record into, a new one by default
+      profiler (SamplingProfiler): optional profiler for slow callbacks
+
+    Returns:
+      CallbackMetrics: the store the measurements go to
+    """
+    metrics = metrics or CallbackMetrics()
+    register = app.callback
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        before = set(app.callback_map)
+        decorator = register(*args, **kwargs)
+        added = set(app.callback_map) - before
+
+        def wrap(func):
+            result = decorator(_timed_function(func, func.__name__, metrics, profiler))
+            # Dash wraps the function again to serialize its output: time that too
+            for key in added:
+                entry = app.callback_map[key]
+                entry["callback"] = _timed_dispatch(entry["callback"], func.__name__,
+                                                    metrics)
+            return result
+
+        return wrap
+
+    app.callback = callback
+    app.server.add_url_rule(
+        route, "metrics",
+        lambda: flask.Response(metrics.render(), content_type=CONTENT_TYPE))
+    return metrics
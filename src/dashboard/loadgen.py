@@ -0,0 +1,528 @@
+"""
+Headless load generator replaying dashboard sessions.
+
+Each simulated operator loads the layout, fires the initial callbacks like
+the browser does and then keeps changing date ranges, aggregation windows,
+node selections and graph edits. Interactions are turned into
+``_dash-update-component`` requests using the callback graph the running app
+publishes on ``_dash-dependencies``, so the tool follows the app as it
+changes. Outputs are applied to the session state and chained callbacks are
+fired in turn.
+
+Start the app locally (``python -m dashboard.chart``), then::
+
+    dashboard-loadgen http://127.0.0.1:8050 --users 20 --duration 60
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from dashboard import __version__
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+_logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ["1h", "3h", "6h", "1D", "1W"]
+GRAPH_BUTTONS = ["remove-button", "select-button", "reset-button"]
+
+
+# ---- HTTP ----
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None):
+        """Send a request, returns ``(status, body bytes)``"""
+        try:
+            return await self._request(method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The server dropped the keep-alive connection: retry once
+            await self.close()
+            return await self._request(method, path, body)
+
+    async def _request(self, method, path, body):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host,
+                                                                       self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                "Connection: keep-alive\r\n\r\n")
+        self._writer.write(head.encode() + payload)
+        await self._writer.drain()
+
+        status = int((await self._reader.readuntil(b"\r\n")).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunks.append(await self._reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            data = b"".join(chunk[:-2] for chunk in chunks)
+        elif "content-length" in headers:
+            data = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self._reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = self._writer = None
+
+
+# ---- Callback graph ----
+
+
+def _split_output(output):
+    """``"a.b"`` or ``"..a.b...c.d.."`` into ``[(id, property), ...]``"""
+    if output.startswith(".."):
+        parts = output[2:-2].split("...")
+    else:
+        parts = [output]
+    return [tuple(part.rsplit(".", 1)) for part in parts]
+
+
+def load_components(layout):
+    """Map component id to its props for every component in a layout tree"""
+    components = {}
+
+    def walk(node):
+        if isinstance(node, list):
+            for child in node:
+                walk(child)
+        elif isinstance(node, dict) and "props" in node:
+            props = node["props"]
+            if isinstance(props.get("id"), str):
+                components[props["id"]] = {k: v for k, v in props.items()
+                                           if k != "children"}
+            for value in props.values():
+                walk(value)
+
+    walk(layout)
+    return components
+
+
+class CallbackGraph:
+    """Server callbacks of an app, indexed by the props that trigger them"""
+
+    def __init__(self, dependencies):
+        self.callbacks = []
+        self.by_input = defaultdict(list)
+        for dep in dependencies:
+            if dep.get("clientside_function"):
+                continue
+            ids = [item["id"] for item in dep["inputs"] + dep.get("state", [])]
+            if (any(not isinstance(i, str) for i in ids)
+                    or dep["output"].startswith("{")):
+                # Pattern-matching callbacks are not replayed
+                continue
+            self.callbacks.append(dep)
+            for item in dep["inputs"]:
+                self.by_input[f"{item['id']}.{item['property']}"].append(dep)
+
+    def triggered_by(self, changed):
+        seen, triggered = set(), []
+        for prop in changed:
+            for dep in self.by_input.get(prop, []):
+                if dep["output"] not in seen:
+                    seen.add(dep["output"])
+                    triggered.append(dep)
+        return triggered
+
+
+def build_payload(dep, state, changed):
+    """Body of a ``_dash-update-component`` request, as the renderer sends it"""
+    outputs = [{"id": i, "property": p} for i, p in _split_output(dep["output"])]
+    inputs = {f"{i['id']}.{i['property']}" for i in dep["inputs"]}
+
+    def values(items):
+        return [{"id": item["id"], "property": item["property"],
+                 "value": state.get(item["id"], {}).get(item["property"])}
+                for item in items]
+
+    return {
+        "output": dep["output"],
+        "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+        "inputs": values(dep["inputs"]),
+        "state": values(dep.get("state", [])),
+        "changedPropIds": [prop for prop in changed if prop in inputs],
+    }
+
+
+def apply_patch(value, patch):
+    """Apply a serialized :class:`dash.Patch` to ``value`` like the renderer"""
+    if not (isinstance(patch, dict) and "__dash_patch_update" in patch):
+        return patch
+    value = json.loads(json.dumps(value)) if value is not None else None
+    for op in patch["operations"]:
+        location, params = op["location"], op["params"]
+        if op["operation"] in ("Assign", "Delete"):
+            *location, last = location
+        target = value
+        for key in location:
+            target = target[key]
+        name = op["operation"]
+        if name == "Assign":
+            target[last] = params["value"]
+        elif name == "Delete":
+            del target[last]
+        elif name == "Insert":
+            target.insert(params["index"], params["value"])
+        elif name == "Append":
+            target.append(params["value"])
+        elif name == "Prepend":
+            target.insert(0, params["value"])
+        elif name == "Extend":
+            target.extend(params["value"])
+        elif name == "Merge":
+            target.update(params["value"])
+        elif name == "Clear":
+            target.clear()
+        elif name == "Remove":
+            target.remove(params["value"])
+        else:
+            _logger.debug("Unsupported patch operation %s", name)
+    return value
+
+
+# ---- Scenarios ----
+# Each scenario returns the interaction as a list of steps, a step being the
+# props changed by the operator at once, or None when the layout lacks the
+# components it needs.
+
+
+def change_date_range(state, rng):
+    picker = state.get("date-picker")
+    if not picker or not picker.get("min_date_allowed"):
+        return None
+    first = datetime.date.fromisoformat(picker["min_date_allowed"][:10])
+    last = datetime.date.fromisoformat(picker["max_date_allowed"][:10])
+    span = (last - first).days
+    start = first + datetime.timedelta(days=rng.randrange(max(span, 1)))
+    end = min(start + datetime.timedelta(days=rng.randint(1, max(span, 1))), last)
+    return [{("date-picker", "start_date"): start.isoformat(),
+             ("date-picker", "end_date"): end.isoformat()}]
+
+
+def change_aggregation(state, rng):
+    if "aggregation" not in state:
+        return None
+    return [{("aggregation", "value"): rng.choice(AGGREGATIONS)}]
+
+
+def select_nodes(state, rng):
+    steps = []
+    options = state.get("dropdown", {}).get("options")
+    if options:
+        values = [o["value"] if isinstance(o, dict) else o for o in options]
+        chosen = rng.sample(values, rng.randint(1, min(5, len(values))))
+        steps.append({("dropdown", "value"): chosen})
+    if "node_id" in state:
+        steps.append({("node_id", "value"): rng.choice([-1] + list(range(10)))})
+    return steps or None
+
+
+def edit_graph(state, rng):
+    elements = state.get("cytoscape", {}).get("elements")
+    buttons = [b for b in GRAPH_BUTTONS if b in state]
+    if not buttons:
+        return None
+    steps = []
+    nodes = [e["data"] for e in elements or [] if "source" not in e.get("data", {})]
+    if nodes:
+        selection = rng.sample(nodes, rng.randint(1, min(5, len(nodes))))
+        steps.append({("cytoscape", "selectedNodeData"): selection})
+    button = rng.choice(buttons)
+    steps.append({(button, "n_clicks"): (state[button].get("n_clicks") or 0) + 1})
+    return steps
+
+
+SCENARIOS = [change_date_range, change_aggregation, select_nodes, edit_graph]
+
+
+# ---- Sessions ----
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = self.finished = None
+
+    def record(self, callback, latency, status):
+        self.latencies[callback].append(latency)
+        if status >= 400:
+            self.errors[callback] += 1
+
+    def summary(self):
+        """Throughput and latency percentiles overall and per callback"""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = {}
+        everything = []
+        for callback, latencies in sorted(self.latencies.items()):
+            everything.extend(latencies)
+            rows[callback] = _percentiles(latencies, self.errors[callback])
+        total = _percentiles(everything, sum(self.errors.values()))
+        total["throughput"] = len(everything) / elapsed if elapsed > 0 else 0.0
+        return {"total": total, "callbacks": rows, "elapsed": elapsed}
+
+
+def _percentiles(latencies, errors):
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    values = np.asarray(latencies) * 1e3
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+class Session:
+    """One simulated operator with its own connection and component state"""
+
+    def __init__(self, base, graph, stats, rng, max_chain=5):
+        self.base = base
+        self.graph = graph
+        self.state = {}
+        self.stats = stats
+        self.rng = rng
+        self.max_chain = max_chain
+        url = urlsplit(base)
+        self.prefix = url.path.rstrip("/")
+        self.connection = HTTPConnection(url.hostname, url.port or 80)
+
+    async def start(self):
+        """Load the layout and fire the initial callbacks like a page load"""
+        status, layout = await self.connection.request("GET",
+                                                       f"{self.prefix}/_dash-layout")
+        if status != 200:
+            raise RuntimeError(f"Could not load the layout: {status}")
+        self.state = load_components(json.loads(layout))
+        changed = [f"{i}.{p}" for i, props in self.state.items() for p in props]
+        await self.fire(changed, initial=True)
+
+    async def interact(self):
+        interactions = [steps for steps in (s(self.state, self.rng) for s in SCENARIOS)
+                        if steps]
+        if not interactions:
+            return
+        for step in self.rng.choice(interactions):
+            for (component, prop), value in step.items():
+                self.state.setdefault(component, {})[prop] = value
+            await self.fire([f"{c}.{p}" for c, p in step])
+
+    async def fire(self, changed, initial=False):
+        fired = set()
+        for _ in range(self.max_chain):
+            triggered = [dep for dep in self.graph.triggered_by(changed)
+                         if dep["output"] not in fired
+                         and not (initial and dep.get("prevent_initial_call"))]
+            if not triggered:
+                return
+            updated = []
+            for dep in triggered:
+                fired.add(dep["output"])
+                updated.extend(await self.call(dep, [] if initial else changed))
+            changed, initial = updated, False
+
+    async def call(self, dep, changed):
+        payload = build_payload(dep, self.state, changed)
+        start = time.perf_counter()
+        status, body = await self.connection.request(
+            "POST", f"{self.prefix}/_dash-update-component", payload)
+        self.stats.record(dep["output"], time.perf_counter() - start, status)
+        if status != 200:
+            if status >= 400:
+                _logger.debug("%s failed with %d: %s", dep["output"], status,
+                              body[:200])
+            return []
+        updated = []
+        for component, props in json.loads(body).get("response", {}).items():
+            for prop, value in props.items():
+                props_state = self.state.setdefault(component, {})
+                props_state[prop] = apply_patch(props_state.get(prop), value)
+                updated.append(f"{component}.{prop}")
+        return updated
+
+
+async def run_load(url, users=10, duration=30.0, think_time=1.0, seed=None):
+    """
+    Simulate ``users`` operators against the app at ``url`` for ``duration``
+    seconds, pausing on average ``think_time`` seconds between interactions.
+
+    Returns:
+      dict: see :meth:`Stats.summary`
+    """
+    base = url.rstrip("/")
+    probe = HTTPConnection(urlsplit(base).hostname, urlsplit(base).port or 80)
+    prefix = urlsplit(base).path.rstrip("/")
+    status, dependencies = await probe.request("GET", f"{prefix}/_dash-dependencies")
+    await probe.close()
+    if status != 200:
+        raise RuntimeError(f"{url} does not look like a Dash app ({status})")
+
+    graph = CallbackGraph(json.loads(dependencies))
+    stats = Stats()
+    master = random.Random(seed)
+    deadline = time.perf_counter() + duration
+
+    async def operator(rng):
+        session = Session(base, graph, stats, rng)
+        try:
+            await session.start()
+            while time.perf_counter() < deadline:
+                if think_time:
+                    await asyncio.sleep(min(rng.expovariate(1 / think_time),
+                                            max(deadline - time.perf_counter(), 0)))
+                if time.perf_counter() < deadline:
+                    await session.interact()
+        finally:
+            await session.connection.close()
+
+    stats.started = time.perf_counter()
+    await asyncio.gather(*(operator(random.Random(master.random()))
+                           for _ in range(users)))
+    stats.finished = time.perf_counter()
+    return stats.summary()
+
+
+def format_summary(summary):
+    lines = [f"{'callback':<44}{'reqs':>7}{'errs':>6}{'p50 ms':>9}"
+             f"{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+    for name, row in list(summary["callbacks"].items()) + [("TOTAL", summary["total"])]:
+        if not row["requests"]:
+            continue
+        lines.append(f"{name[:43]:<44}{row['requests']:>7}{row['errors']:>6}"
+                     f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                     f"{row['max_ms']:>9.1f}")
+    lines.append(f"throughput: {summary['total'].get('throughput', 0):.1f} req/s "
+                 f"over {summary['elapsed']:.1f} s")
+    return "\n".join(lines)
+
+
+# ---- CLI ----
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--help"]``).
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Replay dashboard sessions against an app")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"dashboard {__version__}",
+    )
+    parser.add_argument(dest="url", help="base URL of the running app",
+                        nargs="?", default="http://127.0.0.1:8050")
+    parser.add_argument("-u", "--users", type=int, default=10,
+                        help="concurrent simulated operators")
+    parser.add_argument("-d", "--duration", type=float, default=30.0,
+                        help="seconds to run")
+    parser.add_argument("-t", "--think-time", type=float, default=1.0,
+                        help="mean pause between interactions in seconds, 0 for none")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+    return parser.parse_args(args)
+
+
+def setup_logging(loglevel):
+    """Setup basic logging
+
+    Args:
+      loglevel (int): minimum loglevel for emitting messages
+    """
+    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+    logging.basicConfig(
+        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+
+def main(args):
+    """Run :func:`run_load` from string arguments and print the summary
+
+    Args:
+      args (List[str]): command line parameters as list of strings
+          (for example  ``["--users", "20", "http://127.0.0.1:8050"]``).
+    """
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+    summary = asyncio.run(run_load(args.url, args.users, args.duration,
+                                   args.think_time, args.seed))
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+
+
+def run():
+    """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
+
+    This function can be used as entry point to create console scripts with setuptools.
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
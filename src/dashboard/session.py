@@ -0,0 +1,284 @@
+"""
+Server-side session state.
+
+Instead of round-tripping the whole Cytoscape ``elements`` list through the
+browser on every graph edit, each page load gets a small session key. The
+graph edit state (which elements of the base network are shown) and the view
+filters live in a :class:`SessionStore` on the server, and callbacks answer
+with a :class:`dash.Patch` holding only the elements to delete or insert
+(see :func:`dashboard.graph.encode_diff`). Callbacks update a session under
+:meth:`SessionStore.lock`, as several of them run at once for the same page.
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from dashboard.graph import encode_diff, mask_digest
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of a worker are serialized
+    fcntl = None
+
+# Callbacks of one session run concurrently on the threads of a worker;
+# updating the same session takes the same lock
+_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+class GraphState:
+    """
+    Which elements of a :class:`~dashboard.graph.CompactGraph` a client shows
+
+    Edits take ``base``, the :meth:`digest` the client's element list was
+    sent with. A patch is only sent when it matches: requests dropped by the
+    browser, failed midway or answered from another worker's state leave the
+    client showing something else, and patching that would hit the wrong
+    elements.
+    """
+
+    def __init__(self, size):
+        self.shown = np.ones(size, dtype=bool)
+
+    def digest(self, graph):
+        """Version of the element list shown"""
+        return mask_digest(graph, self.shown)
+
+    def _show(self, graph, shown, base):
+        """Show the elements ``shown`` and return the update for the client"""
+        update = encode_diff(graph, self.shown, shown, base)
+        self.shown = shown
+        return update
+
+    def remove(self, graph, ids, base):
+        """Remove the nodes ``ids`` and their edges"""
+        nodes = graph.node_mask(ids)
+        shown = self.shown.copy()
+        shown[:graph.nodes] &= ~nodes[:-1]
+        shown[graph.nodes:] &= ~(nodes[graph.source] | nodes[graph.target])
+        return self._show(graph, shown, base)
+
+    def keep(self, graph, ids, base):
+        """Keep only the nodes ``ids`` and the edges between them"""
+        kept = graph.node_mask(ids)
+        shown = self.shown.copy()
+        shown[:graph.nodes] &= kept[:-1]
+        shown[graph.nodes:] &= kept[graph.source] & kept[graph.target]
+        return self._show(graph, shown, base)
+
+    def reset(self, graph, base):
+        """Show every element again"""
+        return self._show(graph, np.ones_like(self.shown), base)
+
+    def elements(self, graph):
+        """Full element list currently shown"""
+        return graph.to_elements(np.flatnonzero(self.shown))
+
+
+class SessionState:
+    """Everything kept on the server for one page load"""
+
+    def __init__(self, graph_size, dataset=None):
+        self.graph = GraphState(graph_size)
+        # Dataset and graph fingerprint the graph state refers to
+        self.dataset = dataset
+        self.fingerprint = None
+        self.filters = {}
+
+
+class SessionStore(ABC):
+    """Maps session keys to :class:`SessionState`"""
+
+    @abstractmethod
+    def get(self, key):
+        """State for ``key``, or ``None`` if it is unknown or was evicted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, key, state):
+        raise NotImplementedError
+
+    #: Whether every worker sees the same sessions
+    shared = False
+
+    def forget(self, key):
+        """Drop the state of ``key``"""
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Hold ``key`` while its state is read, modified and put back, so that
+        concurrent callbacks of a session do not overwrite each other
+        """
+        with _LOCKS[hash(key) % len(_LOCKS)]:
+            yield
+
+    def create(self, graph_size):
+        """Register a new session and return its key"""
+        key = uuid.uuid4().hex
+        self.put(key, SessionState(graph_size))
+        return key
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store keeping the ``maxsize`` most recently used sessions"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, key):
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None:
+                self._sessions.move_to_end(key)
+            return state
+
+    def put(self, key, state):
+        with self._lock:
+            self._sessions[key] = state
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def forget(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+
+class FileSessionStore(SessionStore):
+    """
+    One pickle per session in ``directory``, shared by every worker on the
+    host. Point it at ``/dev/shm`` to keep sessions in shared memory.
+
+    Sessions unused for ``max_age`` seconds are deleted, and so are the least
+    recently used ones beyond ``maxsize``. Writes sweep the directory at most
+    every ``sweep_interval`` seconds.
+    """
+
+    shared = True
+
+    def __init__(self, directory, max_age=86400, maxsize=10000, sweep_interval=60):
+        self.directory = directory
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self.sweep_interval = sweep_interval
+        self._swept = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        if not key or not key.isalnum():
+            raise ValueError(f"Invalid session key: {key!r}")
+        return os.path.join(self.directory, f"{key}.session")
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory)
+                   if name.endswith(".session"))
+
+    @contextmanager
+    def lock(self, key):
+        """Also holds an advisory lock on ``<key>.lock`` against other workers"""
+        with super().lock(key):
+            try:
+                path = self._path(key)[:-len(".session")] + ".lock"
+            except ValueError:
+                path = None
+            if fcntl is None or path is None:
+                yield
+                return
+            with open(path, "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    # Used lock files expire along with their session
+                    os.utime(path)
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def get(self, key):
+        try:
+            path = self._path(key)
+            with open(path, "rb") as fh:
+                state = pickle.load(fh)
+            # The modification time tracks use, for expiry
+            os.utime(path)
+            return state
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, state):
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        # Atomic so concurrent workers never read a half-written session
+        os.replace(tmp, path)
+        if time.monotonic() - self._swept >= self.sweep_interval:
+            self.sweep()
+
+    def forget(self, key):
+        try:
+            self._remove(self._path(key))
+        except ValueError:
+            pass
+
+    def sweep(self):
+        """Delete expired sessions, then the least recently used beyond ``maxsize``"""
+        self._swept = time.monotonic()
+        now = time.time()
+        sessions = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".session", ".tmp", ".lock")):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - mtime > self.max_age:
+                    # Temporary files this old are left over from crashed writes
+                    self._remove(entry.path)
+                elif entry.name.endswith(".session"):
+                    sessions.append((mtime, entry.path))
+        sessions.sort()
+        for _, path in sessions[:max(len(sessions) - self.maxsize, 0)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        """Delete a file, and the lock of a session file"""
+        paths = [path]
+        if path.endswith(".session"):
+            paths.append(path[:-len(".session")] + ".lock")
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def store_from_env():
+    """
+    :class:`FileSessionStore` in ``DASHBOARD_SESSION_DIR`` when set, otherwise
+    a :class:`MemorySessionStore`. Either keeps ``DASHBOARD_SESSION_CACHE``
+    sessions, files also expire after ``DASHBOARD_SESSION_MAX_AGE`` seconds.
+    """
+    directory = os.getenv("DASHBOARD_SESSION_DIR")
+    if directory:
+        return FileSessionStore(
+            directory,
+            max_age=float(os.getenv("DASHBOARD_SESSION_MAX_AGE", "86400")),
+            maxsize=int(os.getenv("DASHBOARD_SESSION_CACHE", "10000")))
+    return MemorySessionStore(int(os.getenv("DASHBOARD_SESSION_CACHE", "1024")))
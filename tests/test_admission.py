@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from dash.exceptions import PreventUpdate
+
+from dashboard.admission import (INTERACTIVE, QUERY, Admission, AdmissionQueue,
+                                 Overloaded, SingleFlight)
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def test_single_flight_shares_one_computation():
+    flights, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "figure"
+
+    def call():
+        results.append(flights.do("key", compute))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    threads[0].start()
+    while not len(flights):
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert sorted(results) == [("figure", False)] + [("figure", True)] * 4
+    assert len(flights) == 0
+
+
+def test_single_flight_raises_in_every_caller():
+    with pytest.raises(ValueError):
+        SingleFlight().do("key", int, "x")
+
+
+def test_interactive_callbacks_go_first():
+    queue = AdmissionQueue(slots=2, reserved=1, timeout=5)
+    order = []
+
+    def waiter(priority, name):
+        with queue.admit(priority):
+            order.append(name)
+
+    with queue.admit(INTERACTIVE):
+        # The reserved slot is left to interactive callbacks
+        query = threading.Thread(target=waiter, args=(QUERY, "query"))
+        query.start()
+        while not queue.waiting:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=waiter, args=(INTERACTIVE, "interactive"))
+        interactive.start()
+        interactive.join(5)
+        assert order == ["interactive"] and queue.waiting == 1
+    query.join(5)
+    assert order == ["interactive", "query"] and queue.running == 0
+
+
+def test_callbacks_are_shed_when_the_queue_is_full():
+    queue = AdmissionQueue(slots=1, reserved=0, max_waiting=0, timeout=5)
+    with queue.admit():
+        with pytest.raises(Overloaded):
+            with queue.admit():
+                pass
+    queue = AdmissionQueue(slots=1, reserved=0, timeout=0.01)
+    with queue.admit():
+        with pytest.raises(Overloaded):
+            with queue.admit():
+                pass
+        assert queue.waiting == 0
+
+
+def test_shed_calls_answer_with_cached_or_degraded_results():
+    queue = AdmissionQueue(slots=1, reserved=0, max_waiting=0)
+    admission = Admission(queue)
+
+    @admission.guard(QUERY, fallback=lambda n: f"coarse {n}")
+    def figure(n):
+        return f"figure {n}"
+
+    @admission.guard(QUERY)
+    def other(n):
+        return n
+
+    assert figure(1) == "figure 1"
+    with queue.admit():
+        assert figure(1) == "figure 1"
+        assert figure(2) == "coarse 2"
+        with pytest.raises(PreventUpdate):
+            other(1)
+    assert admission.stats == {"admitted": 1, "cached": 1, "degraded": 1, "shed": 1}
@@ -0,0 +1,62 @@
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.animation import MISSING, FrameCache, encode_speeds, register_animation
+from dashboard.ingestion import SpeedStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+@pytest.fixture
+def store():
+    index = pd.date_range("2012-03-01", periods=288 * 2, freq="5min")
+    values = np.random.default_rng(0).uniform(0, 70, (len(index), 5))
+    return SpeedStore.from_frame(pd.DataFrame(values, index=index))
+
+
+def test_encode_speeds():
+    encoded = encode_speeds([[0, 34.9, 70, 90, np.nan]], vmax=70, buckets=10)
+    assert encoded.dtype == np.uint8
+    assert encoded.tolist() == [[0, 4, 9, 9, MISSING]]
+
+
+def test_chunks_cover_the_range(store):
+    cache = FrameCache(store, chunk_frames=100)
+    manifest = cache.manifest("2012-03-01", "2012-03-01")
+    assert manifest["frames"] == 288 and manifest["sensors"] == 5
+    assert manifest["chunks"] == 3 and manifest["step_ms"] == 300000
+    assert len(manifest["colors"]) == 64 and manifest["missing"]
+
+    data = b"".join(cache.chunk("2012-03-01", "2012-03-01", i) for i in range(3))
+    decoded = np.frombuffer(data, dtype=np.uint8).reshape(288, 5)
+    expected = encode_speeds(store.frame("2012-03-01", "2012-03-01 23:55").to_numpy())
+    np.testing.assert_array_equal(decoded, expected)
+    with pytest.raises(IndexError):
+        cache.chunk("2012-03-01", "2012-03-01", 3)
+
+
+def test_appends_invalidate_overlapping_ranges(store):
+    cache = FrameCache(store)
+    closed = cache.frames("2012-03-01", "2012-03-01")
+    open_ended = cache.frames("2012-03-02", None)
+    store.append([store.last + pd.Timedelta("5min")], np.zeros((1, 5)))
+    assert cache.frames("2012-03-01", "2012-03-01") is closed
+    refreshed = cache.frames("2012-03-02", None)
+    assert len(refreshed.times) == len(open_ended.times) + 1
+
+
+def test_route(store):
+    server = flask.Flask(__name__)
+    cache = FrameCache(store, chunk_frames=100)
+    register_animation(server, cache)
+    client = server.test_client()
+
+    response = client.get("/animation/2?start=2012-03-01&end=2012-03-01")
+    assert response.status_code == 200
+    assert response.data == cache.chunk("2012-03-01", "2012-03-01", 2)
+    assert client.get("/animation/3?start=2012-03-01&end=2012-03-01").status_code == 404
+    assert client.get("/animation/0?start=never").status_code == 400
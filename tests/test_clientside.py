@@ -0,0 +1,42 @@
+import dash
+from dash import Input, Output, html
+
+from dashboard.clientside import CLIENT, SERVER, classify, presentation
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _app(**kwargs):
+    app = dash.Dash(__name__)
+    app.layout = html.Div([html.Div(id="in"), html.Div(id="text"), html.Div(id="data")])
+
+    @presentation(app, Output("text", "children"), Input("in", "children"), **kwargs)
+    def show(value):
+        return f"Value: {value}"
+
+    @app.callback(Output("data", "children"), Input("in", "children"))
+    def load(value):
+        return value
+
+    return app, show
+
+
+def test_presentation_callbacks_run_clientside():
+    app, show = _app()
+    assert classify(app) == {"text.children": CLIENT, "data.children": SERVER}
+    (callback,) = [c for c in app._callback_list if c.get("clientside_function")]
+    assert callback["clientside_function"] == {"namespace": "presentation",
+                                               "function_name": "show"}
+    # The Python function is left as the reference implementation
+    assert show(1) == "Value: 1"
+
+
+def test_presentation_callbacks_fall_back_to_server(monkeypatch):
+    app, _ = _app(server=True)
+    assert set(classify(app).values()) == {SERVER}
+
+    monkeypatch.setenv("DASHBOARD_CLIENTSIDE", "0")
+    app, _ = _app()
+    assert set(classify(app).values()) == {SERVER}
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.connectors import PacingScheduler, ReplayConnector
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_pacing_scheduler_compresses_event_time():
+    clock = _FakeClock()
+    scheduler = PacingScheduler(speed=100, clock=clock, sleep=clock.sleep)
+    events = [0, 300, 600, 900]
+    assert list(scheduler.pace(events, key=float)) == events
+    assert clock.sleeps == pytest.approx([3.0, 3.0, 3.0])
+
+    clock.now += 10
+    assert scheduler.wait(1200) == pytest.approx(7.0)
+    assert scheduler.max_lag == pytest.approx(7.0)
+    with pytest.raises(ValueError):
+        PacingScheduler(speed=0)
+
+
+def _archive(periods=12):
+    index = pd.date_range("2012-03-01", periods=periods, freq="5min")
+    values = np.random.default_rng(0).uniform(0, 70, (periods, 4))
+    return pd.DataFrame(values, index=index)
+
+
+def test_replay_streams_archive_into_store():
+    archive = _archive()
+    replay = ReplayConnector(archive, speed=float("inf"), batch=5)
+    store = replay.make_store(rollups=["1h"])
+    pushes = []
+    store.subscribe(lambda version, first, last: pushes.append(version))
+
+    assert replay.stream(store) == 12
+    assert pushes == [1, 2, 3]
+    np.testing.assert_allclose(store.frame().to_numpy(), archive.to_numpy(), rtol=1e-6)
+    assert replay.stats()["rows"] == 12
+
+
+def test_replay_loops_shifted_in_time():
+    archive = _archive()
+    replay = ReplayConnector(archive, speed=float("inf"), batch=4, loop=True)
+    store = replay.make_store()
+    assert replay.stream(store, max_rows=30) == 30
+    assert store.last == archive.index[0] + pd.Timedelta("5min") * 29
+    np.testing.assert_allclose(store.frame().to_numpy()[12:24], archive.to_numpy(),
+                               rtol=1e-6)
+
+
+def test_replay_reads_parquet(tmpdir):
+    pytest.importorskip("pyarrow")
+    archive = _archive()
+    archive.columns = archive.columns.astype(str)
+    path = str(tmpdir.join("speeds.parquet"))
+    archive.to_parquet(path)
+    replay = ReplayConnector(path, speed=float("inf"))
+    pd.testing.assert_frame_equal(replay.connect(), archive, check_freq=False)
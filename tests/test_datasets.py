@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.connectors import ReplayConnector
+from dashboard.datasets import (Dataset, DatasetRegistry, datasets_from_config,
+                                nearest_neighbour_graph)
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _frame(sensors=3, periods=288):
+    index = pd.date_range("2012-03-01", periods=periods, freq="5min")
+    values = np.random.default_rng(sensors).uniform(20, 70, (periods, sensors))
+    return pd.DataFrame(values.astype("float32"), index=index,
+                        columns=pd.RangeIndex(sensors))
+
+
+def _locations(sensors=3):
+    return pd.DataFrame({"lat": np.arange(sensors, dtype=float),
+                         "lon": np.zeros(sensors)})
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _registry(**kwargs):
+    loads = []
+    registry = DatasetRegistry(**kwargs)
+    for name, sensors in [("a", 3), ("b", 30), ("c", 3)]:
+        def speeds(name=name, sensors=sensors):
+            loads.append(name)
+            return _frame(sensors)
+
+        def locations(sensors=sensors):
+            return _locations(sensors)
+
+        registry.register(Dataset(name, speeds=speeds, locations=locations))
+    return registry, loads
+
+
+def test_datasets_load_lazily_once():
+    registry, loads = _registry()
+    assert registry.default == "a"
+    assert [o["value"] for o in registry.options()] == ["a", "b", "c"]
+    assert loads == [] and registry.loaded("b") is None
+    dataset = registry.get("b")
+    assert registry.get("b") is dataset and loads == ["b"]
+    assert len(dataset.store) == 288 and len(dataset.graph) == 30 + 2 * 30
+    assert registry.get().name == "a"
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+def test_memory_accounting_counts_attached_components():
+    registry, _ = _registry()
+    dataset = registry.get("a")
+    base = dataset.nbytes
+    assert base >= 288 * 3 * (4 + 8 / 3)
+    dataset.add("extra", _frame(3))
+    assert dataset.nbytes > base + 288 * 3 * 4
+    assert registry.nbytes() == dataset.nbytes
+
+
+def test_idle_datasets_are_evicted():
+    clock = Clock()
+    registry, loads = _registry(idle=10, clock=clock)
+    closed = []
+    registry.get("a").on_close(lambda: closed.append("a"))
+    clock.now = 5
+    registry.get("b")
+    clock.now = 12
+    registry.get("c")
+    assert registry.loaded("a") is None and closed == ["a"]
+    assert registry.loaded("b") is not None
+    registry.get("a")
+    assert loads == ["a", "b", "c", "a"]
+
+
+def test_least_recently_used_evicted_over_budget():
+    clock = Clock()
+    registry, _ = _registry(clock=clock)
+    small = registry.get("a").nbytes
+    registry.max_bytes = 2.5 * small
+    registry.get("c")
+    clock.now = 1
+    registry.get("a")
+    clock.now = 2
+    # "b" alone is over budget, it stays loaded while in use
+    registry.get("b")
+    assert [registry.loaded(n) is not None for n in "abc"] == [False, True, False]
+
+
+def test_replayed_dataset_stays_loaded_until_unloaded():
+    frame = _frame()
+    clock = Clock()
+    registry, _ = _registry(idle=10, max_bytes=1, clock=clock)
+    connector = ReplayConnector(frame, speed=float("inf"))
+    registry.register(Dataset("live", connector=connector, locations=_locations))
+    dataset = registry.get("live")
+    assert dataset.time_range[0] == frame.index[0]
+
+    # Neither idle nor over budget evicts it: a reload would restart the replay
+    clock.now = 100
+    registry.get("a")
+    assert registry.loaded("live") is dataset and dataset.dataset.connector._thread
+
+    registry.unload("live")
+    assert dataset.dataset.connector._thread is None
+
+
+def test_nearest_neighbour_graph():
+    graph = nearest_neighbour_graph(_locations(4), k=1)
+    edges = [(e["data"]["source"], e["data"]["target"]) for e in graph.to_elements()
+             if "source" in e["data"]]
+    assert edges == [("0", "1"), ("1", "0"), ("2", "1"), ("3", "2")]
+    assert len(nearest_neighbour_graph(_locations(3), k=5)) == 3 + 3 * 2
+    assert len(nearest_neighbour_graph(_locations(1))) == 1
+    assert len(nearest_neighbour_graph(_locations(0))) == 0
+
+
+def test_datasets_from_config(tmp_path):
+    pytest.importorskip("pyarrow")
+    _frame().to_parquet(tmp_path / "speeds.parquet")
+    _locations().to_csv(tmp_path / "sensors.csv", index=False)
+    edges = pd.DataFrame({"source": [0, 1], "target": [1, 2]})
+    edges.to_csv(tmp_path / "edges.csv", index=False)
+    config = tmp_path / "datasets.json"
+    config.write_text(json.dumps([
+        {"name": "custom", "title": "Custom",
+         "speeds": str(tmp_path / "speeds.parquet"),
+         "locations": str(tmp_path / "sensors.csv"),
+         "graph": str(tmp_path / "edges.csv")},
+    ]))
+
+    (custom,) = datasets_from_config(config)
+    assert custom.title == "Custom"
+    dataset = custom.load()
+    assert len(dataset.store) == 288
+    assert list(dataset.locations.columns) == ["lat", "lon"]
+    assert len(dataset.graph) == 3 + 2
+    assert dataset.node_sensors == {"0": 0, "1": 1, "2": 2}
@@ -0,0 +1,87 @@
+import os
+import queue
+import socket
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.events import (DATA_VERSION, GRAPH_EDIT, Debouncer, NullEventBus,
+                              SocketEventBus, announce_appends)
+from dashboard.ingestion import SpeedStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+@pytest.fixture
+def buses(tmp_path):
+    started = []
+
+    def make(name):
+        bus = SocketEventBus(str(tmp_path), name=name)
+        bus.start()
+        started.append(bus)
+        return bus
+
+    yield make
+    for bus in started:
+        bus.stop()
+
+
+def test_events_reach_other_processes_only(buses):
+    worker, ingest = buses("worker"), buses("ingest")
+    received, own = queue.Queue(), queue.Queue()
+    worker.subscribe(GRAPH_EDIT, received.put)
+    ingest.subscribe(GRAPH_EDIT, own.put)
+
+    ingest.publish(GRAPH_EDIT, session="abc")
+    assert received.get(timeout=2) == {"session": "abc", "sender": "ingest"}
+    assert own.empty()
+
+
+def test_dead_peers_are_removed(buses, tmp_path):
+    # Bound once, nobody receives on it anymore
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    dead.bind(str(tmp_path / "dead.sock"))
+    dead.close()
+    bus = buses("alive")
+    assert len(bus.peers()) == 1
+    bus.publish(GRAPH_EDIT, session="abc")
+    assert bus.peers() == []
+    bus.stop()
+    assert os.listdir(tmp_path) == []
+
+
+def test_announce_appends(buses):
+    worker, ingest = buses("worker"), buses("ingest")
+    received = queue.Queue()
+    worker.subscribe(DATA_VERSION, received.put)
+    store = SpeedStore(range(2))
+    announce_appends(store, ingest)
+    store.append(pd.date_range("2012-03-01", periods=3, freq="5min"), np.zeros((3, 2)))
+    event = received.get(timeout=2)
+    assert event["version"] == 1
+    assert pd.Timestamp(event["last"]) == store.last
+
+
+def test_null_bus_publishes_nowhere():
+    bus = NullEventBus()
+    bus.subscribe(GRAPH_EDIT, pytest.fail)
+    bus.start()
+    bus.publish(GRAPH_EDIT, session="abc")
+    bus.stop()
+
+
+def test_debouncer_folds_bursts_per_key():
+    handled = queue.Queue()
+    debounced = Debouncer(handled.put, delay=0.05, key=lambda e: e["dataset"],
+                          merge=lambda a, b: dict(b, first=min(a["first"], b["first"])))
+    for first in [3, 1, 2]:
+        debounced({"dataset": "a", "first": first})
+    debounced({"dataset": "b", "first": 7})
+    events = sorted([handled.get(timeout=2), handled.get(timeout=2)],
+                    key=lambda e: e["dataset"])
+    assert events == [{"dataset": "a", "first": 1}, {"dataset": "b", "first": 7}]
+    assert handled.empty()
@@ -0,0 +1,98 @@
+import io
+
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.export import export_frames, register_export
+from dashboard.ingestion import SpeedStore
+from dashboard.session import MemorySessionStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+@pytest.fixture
+def frame():
+    index = pd.date_range("2012-03-01", periods=500, freq="5min")
+    values = np.random.default_rng(0).uniform(20, 70, (500, 4)).astype("float32")
+    return pd.DataFrame(values, index=index, columns=pd.RangeIndex(4))
+
+
+@pytest.fixture
+def client(frame):
+    server = flask.Flask(__name__)
+    sessions = MemorySessionStore()
+    # Small chunks so aggregation bins span chunk boundaries
+    register_export(server, SpeedStore.from_frame(frame, chunk_rows=37), sessions)
+    server.sessions = sessions
+    return server.test_client()
+
+
+def _csv(response):
+    assert response.status_code == 200
+    return pd.read_csv(io.BytesIO(response.data), index_col="timestamp",
+                       parse_dates=True)
+
+
+def test_csv_raw_rows(client, frame):
+    result = _csv(client.get("/export?start=2012-03-01&end=2012-03-01&sensors=1,3"))
+    expected = frame.loc["2012-03-01", [1, 3]]
+    assert list(result.columns) == ["1", "3"]
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-6)
+    assert (result.index == expected.index).all()
+
+
+def test_csv_aggregated_matches_resample(client, frame):
+    result = _csv(client.get("/export?aggregation=1h"))
+    expected = frame.resample("1h").mean()
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-5)
+
+
+@pytest.mark.parametrize("aggregation", ["1h", "1D", "7D"])
+def test_aggregation_across_chunks_and_gaps(frame, aggregation):
+    frame = pd.concat([frame, frame.set_axis(frame.index + pd.Timedelta("20D"))])
+    frame.iloc[3, 1] = np.nan
+    store = SpeedStore.from_frame(frame, chunk_rows=37)
+    result = pd.concat(list(export_frames(store, aggregation=aggregation)))
+    expected = frame.resample(aggregation, origin=frame.index[0].floor("D")).mean()
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-5)
+
+
+def test_session_filters_are_defaults(client, frame):
+    key = client.application.sessions.create(1)
+    client.application.sessions.get(key).filters.update(
+        node_id="2", start="2012-03-02", end="2012-03-02", aggregation="1D")
+    result = _csv(client.get(f"/export?session={key}"))
+    assert list(result.columns) == ["2"]
+    expected = frame.loc["2012-03-02", 2].mean()
+    assert result.iloc[0, 0] == pytest.approx(expected, rel=1e-5)
+
+    # The chart shows the mean of every sensor
+    client.application.sessions.get(key).filters["node_id"] = -1
+    result = _csv(client.get(f"/export?session={key}"))
+    assert list(result.columns) == ["0", "1", "2", "3"]
+
+    # Explicit parameters win over the session
+    client.application.sessions.get(key).filters["node_id"] = 2
+    assert list(_csv(client.get(f"/export?session={key}&sensors=ALL")).columns) == \
+        ["0", "1", "2", "3"]
+    assert list(_csv(client.get(f"/export?session={key}&sensors=1")).columns) == ["1"]
+
+
+@pytest.mark.parametrize("query", ["sensors=9", "sensors=x", "start=never",
+                                   "aggregation=often", "format=xlsx"])
+def test_invalid_requests(client, query):
+    assert client.get(f"/export?{query}").status_code == 400
+
+
+def test_parquet_round_trip(client, frame):
+    pytest.importorskip("pyarrow")
+    response = client.get("/export?format=parquet&sensors=0")
+    assert response.status_code == 200
+    result = pd.read_parquet(io.BytesIO(response.data)).set_index("timestamp")
+    np.testing.assert_array_equal(result["0"].to_numpy(), frame[0].to_numpy())
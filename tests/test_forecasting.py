@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from dashboard.forecasting import ForecastService, HistoricalAverageForecaster
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _history(days=3, steps_per_day=4, sensors=2):
+    values = np.tile(np.arange(steps_per_day, dtype=float), days)[:, None]
+    values = values + np.arange(sensors)[None, :] * 10
+    index = pd.date_range("2012-03-01", periods=len(values), freq="6h")
+    return pd.DataFrame(values, index=index, columns=range(sensors))
+
+
+def test_historical_average_repeats_daily_profile():
+    model = HistoricalAverageForecaster(horizon=4, steps_per_day=4, days=2)
+    predicted = model.predict(_history().to_numpy())
+    assert predicted.shape == (4, 2)
+    np.testing.assert_allclose(predicted[:, 0], [0, 1, 2, 3])
+    np.testing.assert_allclose(predicted[:, 1], [10, 11, 12, 13])
+
+
+def test_historical_average_short_history_falls_back_to_last_value():
+    model = HistoricalAverageForecaster(horizon=2, steps_per_day=4, days=1)
+    predicted = model.predict(np.array([[1.0], [2.0]]))
+    np.testing.assert_allclose(predicted[:, 0], [2.0, 2.0])
+
+
+class _CountingForecaster(HistoricalAverageForecaster):
+    calls = 0
+
+    def predict(self, history):
+        self.calls += 1
+        return super().predict(history)
+
+
+def test_service_caches_by_version_and_timestamp():
+    history = _history()
+    model = _CountingForecaster(horizon=2, steps_per_day=4, days=1)
+    service = ForecastService(model, source=lambda: history)
+    assert service.latest() is None
+
+    first = service.refresh()
+    second = service.refresh()
+    assert model.calls == 1
+    assert first is second
+    assert first.index[0] == history.index[-1] + pd.Timedelta("6h")
+    assert service.get(history.index[-1]) is first
+
+    service.invalidate()
+    assert service.latest() is None
+
+
+def test_service_waits_for_history():
+    history = _history()
+    service = ForecastService(HistoricalAverageForecaster(),
+                              source=lambda: history.iloc[:1])
+    assert service.refresh() is None and service.latest() is None
@@ -0,0 +1,92 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from dashboard.assets import metr_la_network
+from dashboard.graph import CompactGraph, diff, encode_diff, mask_digest
+from dashboard.loadgen import apply_patch
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+ELEMENTS = (
+    [{"data": {"id": "a", "label": "Node a"}},
+     {"data": {"id": "b"}},
+     {"data": {"id": "c", "label": "Node c", "lanes": 3}}]
+    + [{"data": {"source": "a", "target": "b", "weight": 0.5}},
+       {"data": {"source": "b", "target": "c"}},
+       {"data": {"source": "c", "target": "z"}}]
+)
+
+
+def test_round_trip_through_elements():
+    graph = CompactGraph.from_elements(ELEMENTS)
+    assert graph.nodes == 3 and len(graph) == 6
+    assert graph.source.tolist() == [0, 1, 2] and graph.target.tolist() == [1, 2, -1]
+    assert graph.to_elements() == ELEMENTS
+    assert graph.to_elements([1, 4]) == [ELEMENTS[1], ELEMENTS[4]]
+    assert graph.positions(["c", "z", "a"]).tolist() == [2, 0]
+    assert graph.nbytes > graph.source.nbytes + graph.target.nbytes
+
+
+def test_fingerprint_tells_graphs_apart():
+    graph = CompactGraph.from_elements(ELEMENTS)
+    assert CompactGraph.from_elements(ELEMENTS).fingerprint == graph.fingerprint
+    other = ELEMENTS[:4] + [{"data": {"source": "c", "target": "b"}}] + ELEMENTS[5:]
+    assert CompactGraph.from_elements(other).fingerprint != graph.fingerprint
+
+
+def test_bundled_graph_is_the_same_in_every_process():
+    code = ("from dashboard.assets import metr_la_network; "
+            "from dashboard.graph import CompactGraph; "
+            "print(CompactGraph.from_elements(metr_la_network).fingerprint)")
+    other = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                           check=True).stdout.strip()
+    assert other == CompactGraph.from_elements(metr_la_network).fingerprint
+
+
+def test_numbered_graph():
+    graph = CompactGraph.from_edges(3, [0, 1], [1, 2], labels=["x", "y", "z"])
+    assert graph.ids is None
+    assert graph.positions(["2", "02", "3", "b"]).tolist() == [2]
+    assert graph.to_elements([0, 4]) == [{"data": {"id": "0", "label": "x"}},
+                                         {"data": {"source": "1", "target": "2"}}]
+    assert CompactGraph.from_elements(graph.to_elements()).ids is None
+
+
+def test_diff_encodes_minimal_changes():
+    graph = CompactGraph.from_edges(10, np.arange(9), np.arange(1, 10))
+    before = np.ones(len(graph), dtype=bool)
+    before[[2, 12]] = False
+    after = before.copy()
+    after[[2, 15]] = True, False
+    removed, added = diff(before, after)
+    assert removed.tolist() == [15] and added.tolist() == [2]
+
+    client = graph.to_elements(np.flatnonzero(before))
+    base = mask_digest(graph, before)
+    patch = json.loads(to_json_plotly(encode_diff(graph, before, after, base)))
+    assert [op["operation"] for op in patch["operations"]] == ["Delete", "Insert"]
+    assert apply_patch(client, patch) == graph.to_elements(np.flatnonzero(after))
+
+    # Showing far fewer elements sends the full list
+    after[3:] = False
+    assert encode_diff(graph, before, after, base) == graph.to_elements([0, 1, 2])
+
+
+def test_diff_of_another_base_sends_the_full_list():
+    graph = CompactGraph.from_edges(10, np.arange(9), np.arange(1, 10))
+    before = np.ones(len(graph), dtype=bool)
+    after = before.copy()
+    after[15] = False
+    # The client still shows element 3, which the server believes is gone
+    client = before.copy()
+    before[3] = False
+    update = encode_diff(graph, before, after, mask_digest(graph, client))
+    assert update == graph.to_elements(np.flatnonzero(after))
+    assert encode_diff(graph, before, after, None) == update
+    assert mask_digest(graph, before) != mask_digest(graph, client)
@@ -0,0 +1,122 @@
+import os
+import struct
+import zlib
+
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.animation import encode_speeds
+from dashboard.heatmap import (TILE, TilePyramid, corridor_order, encode_png,
+                               register_heatmap)
+from dashboard.ingestion import SpeedStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _decode_png(data):
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    offset, chunks = 8, {}
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset:offset + 4])
+        chunks[data[offset + 4:offset + 8]] = data[offset + 8:offset + 8 + length]
+        offset += length + 12
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    raw = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), np.uint8)
+    return raw.reshape(height, 1 + width * 4)[:, 1:].reshape(height, width, 4)
+
+
+@pytest.fixture
+def store():
+    index = pd.date_range("2012-03-01", periods=600, freq="5min")
+    values = np.random.default_rng(0).uniform(0, 70, (len(index), 3))
+    return SpeedStore.from_frame(pd.DataFrame(values, index=index), chunk_rows=50)
+
+
+def test_encode_png_round_trip():
+    rgba = np.random.default_rng(0).integers(0, 256, (5, 7, 4), dtype=np.uint8)
+    np.testing.assert_array_equal(_decode_png(encode_png(rgba)), rgba)
+
+
+def test_corridor_order_walks_to_nearest():
+    locations = pd.DataFrame({"lon": [3.0, 0.0, 1.0, 2.5], "lat": [0.0, 0.0, 0.1, 0.0]})
+    assert corridor_order(locations).tolist() == [1, 2, 3, 0]
+
+
+def test_tiles_average_time_bins(store, tmp_path):
+    pyramid = TilePyramid(store, directory=str(tmp_path), order=[2, 0, 1])
+    assert pyramid.max_level == 2
+    pixels = _decode_png(pyramid.tile(2, 0, 0))
+    assert pixels.shape == (3, TILE, 4)
+
+    means = store.frame().resample("20min").mean()[[2, 0, 1]].to_numpy()
+    expected = pyramid.colors[encode_speeds(means.T)]
+    np.testing.assert_array_equal(pixels[:, :len(means)], expected)
+    # Past the data the tile is transparent
+    assert (pixels[:, len(means):, 3] == 0).all()
+
+
+def test_disk_cache_is_invalidated_by_appends(store, tmp_path):
+    pyramid = TilePyramid(store, directory=str(tmp_path))
+    complete, partial = pyramid.tile(0, 0, 0), pyramid.tile(0, 0, 2)
+    assert pyramid.complete(0, 0) and not pyramid.complete(0, 2)
+    files = {name for _, _, names in os.walk(pyramid.directory) for name in names}
+    assert files == {"0.png", "2.png"}
+
+    store.append([store.last + pd.Timedelta("5min")], np.zeros((1, 3)))
+    assert os.path.exists(pyramid._path(0, 0, 0))
+    assert not os.path.exists(pyramid._path(0, 0, 2))
+    assert pyramid.tile(0, 0, 0) == complete
+    assert pyramid.tile(0, 0, 2) != partial
+
+    # A new pyramid over the same directory does not trust the partial tile
+    TilePyramid(store, directory=str(tmp_path))
+    assert os.path.exists(pyramid._path(0, 0, 0))
+    assert not os.path.exists(pyramid._path(0, 0, 2))
+
+
+def test_origin_waits_for_the_first_reading(tmp_path):
+    index = pd.date_range("2012-03-01 12:00", periods=600, freq="5min")
+    frame = pd.DataFrame(np.full((600, 3), 50.0), index=index)
+    store = SpeedStore(frame.columns)
+    pyramid = TilePyramid(store, directory=str(tmp_path))
+    assert pyramid.origin is None and pyramid.max_level == 0
+    with pytest.raises(IndexError):
+        pyramid.tile(0, 0, 0)
+    store.append(frame.index, frame.to_numpy())
+    assert pyramid.origin == pd.Timestamp("2012-03-01") and pyramid.max_level == 2
+
+    # A replay starts from its archive's first day
+    pyramid = TilePyramid(SpeedStore(frame.columns), directory=str(tmp_path),
+                          origin=frame.index[0])
+    assert pyramid.origin == pd.Timestamp("2012-03-01")
+
+
+def test_close_removes_temporary_tiles(store, tmp_path):
+    pyramid = TilePyramid(store)
+    pyramid.tile(0, 0, 0)
+    directory = pyramid._base
+    assert os.listdir(directory)
+    pyramid.close()
+    assert not os.path.exists(directory)
+
+    # Configured caches outlive the pyramid
+    pyramid = TilePyramid(store, directory=str(tmp_path))
+    pyramid.tile(0, 0, 0)
+    pyramid.close()
+    assert os.path.exists(pyramid._path(0, 0, 0))
+
+
+def test_route(store, tmp_path):
+    server = flask.Flask(__name__)
+    register_heatmap(server, TilePyramid(store, directory=str(tmp_path)))
+    client = server.test_client()
+    response = client.get("/heatmap/0/0/0.png")
+    assert response.status_code == 200 and response.mimetype == "image/png"
+    assert response.cache_control.max_age == 86400
+    assert client.get("/heatmap/0/0/2.png").cache_control.no_cache
+    assert client.get("/heatmap/9/0/0.png").status_code == 404
+    assert client.get("/heatmap/0/1/0.png").status_code == 404
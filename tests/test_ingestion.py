@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dashboard.ingestion import SpeedStore
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _frame(periods=30, sensors=3, start="2012-03-01"):
+    index = pd.date_range(start, periods=periods, freq="20min")
+    values = np.arange(periods * sensors, dtype=np.float32).reshape(periods, sensors)
+    return pd.DataFrame(values, index=index, columns=[f"s{i}" for i in range(sensors)])
+
+
+def test_append_across_chunks_and_read_back():
+    frame = _frame()
+    store = SpeedStore(frame.columns, chunk_rows=8)
+    store.append(frame.index[:5], frame.to_numpy()[:5])
+    store.append(frame.index[5:], frame.to_numpy()[5:])
+    assert len(store) == 30
+    assert store.first == frame.index[0] and store.last == frame.index[-1]
+
+    pd.testing.assert_frame_equal(store.frame(), frame, check_freq=False)
+    assert [len(chunk) for chunk in store.iter_frames()] == [8, 8, 8, 6]
+    window = store.frame(frame.index[3], frame.index[10], sensors=["s2", "s0"])
+    expected = frame.loc[frame.index[3]:frame.index[10], ["s2", "s0"]]
+    pd.testing.assert_frame_equal(window, expected, check_freq=False)
+    pd.testing.assert_frame_equal(store.tail(10), frame.iloc[-10:], check_freq=False)
+    assert store.frame("2013-01-01").empty
+
+
+def test_append_rejects_out_of_order_rows():
+    frame = _frame()
+    store = SpeedStore.from_frame(frame.iloc[:10])
+    with pytest.raises(ValueError):
+        store.append(frame.index[5:12], frame.to_numpy()[5:12])
+    with pytest.raises(ValueError):
+        store.append(frame.index[10:12], frame.to_numpy()[10:12, :2])
+
+
+def test_rollups_are_maintained_incrementally():
+    frame = _frame()
+    frame.iloc[4, 1] = np.nan
+    store = SpeedStore(frame.columns, rollups=["1h"], chunk_rows=8)
+    for lo in range(0, len(frame), 7):
+        store.append(frame.index[lo:lo + 7], frame.to_numpy()[lo:lo + 7])
+    expected = frame.resample("1h").mean()
+    pd.testing.assert_frame_equal(store.resample("1h"), expected, check_dtype=False)
+    pd.testing.assert_frame_equal(store.resample("2h"), frame.resample("2h").mean())
+
+
+def test_rollups_leave_gaps_empty():
+    frame = _frame().iloc[[0, 1, 15]]
+    store = SpeedStore.from_frame(frame, rollups=["1h", "1D"])
+    expected = frame.resample("1h").mean()
+    pd.testing.assert_frame_equal(store.rollups["1h"].frame(frame.columns), expected,
+                                  check_dtype=False)
+    assert store.resample("1h").iloc[1:5].isna().all().all()
+
+
+def test_subscribers_are_notified_of_appends():
+    frame = _frame()
+    store = SpeedStore(frame.columns)
+    seen = []
+    store.subscribe(lambda *args: seen.append(args))
+    store.append(frame.index[:3], frame.to_numpy()[:3])
+    store.append(frame.index[3:4], frame.to_numpy()[3:4])
+    assert seen == [(1, frame.index[0], frame.index[2]),
+                    (2, frame.index[3], frame.index[3])]
@@ -0,0 +1,76 @@
+import os
+import time
+
+import dash
+from dash import Input, Output, dcc, html
+
+from dashboard.instrumentation import SamplingProfiler, instrument, record_cache
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _app(profiler=None):
+    app = dash.Dash(__name__)
+    metrics = instrument(app, profiler=profiler)
+    app.layout = html.Div([dcc.Input(id="in", value="a"), html.Div(id="out")])
+
+    @app.callback(Output("out", "children"), Input("in", "value"))
+    def echo(value):
+        record_cache(value == "hit", cache="test")
+        return value * 100
+
+    return app, metrics, echo
+
+
+def _request(client, value):
+    return client.post("/_dash-update-component", json={
+        "output": "out.children",
+        "outputs": {"id": "out", "property": "children"},
+        "inputs": [{"id": "in", "property": "value", "value": value}],
+        "changedPropIds": ["in.value"],
+    })
+
+
+def test_metrics_endpoint_reports_callbacks():
+    app, metrics, echo = _app()
+    client = app.server.test_client()
+    assert _request(client, "hit").status_code == 200
+    assert _request(client, "miss").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'dashboard_callback_duration_seconds_count{callback="echo"} 2' in body
+    assert 'dashboard_callback_serialization_seconds_count{callback="echo"} 2' in body
+    assert ('dashboard_callback_payload_bytes_bucket{callback="echo",le="1024"} 2'
+            in body)
+    assert 'cache="test",result="hit"} 1' in body
+    assert 'cache="test",result="miss"} 1' in body
+
+    # Direct calls are timed but never counted as responses
+    assert echo("x") == "x" * 100
+    assert 'duration_seconds_count{callback="echo"} 3' in metrics.render()
+
+
+def test_profiler_dumps_folded_stacks(tmpdir):
+    profiler = SamplingProfiler(str(tmpdir), interval=0.001, threshold=0.0)
+    profiler.begin()
+    sum(i * i for i in range(200000))
+    profiler.end("busy", 1.0)
+    (dump,) = os.listdir(str(tmpdir))
+    assert dump.startswith("busy-") and dump.endswith(".folded")
+    line = tmpdir.join(dump).read().splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert "test_profiler_dumps_folded_stacks" in stack and int(count) > 0
+
+
+def test_profiler_idles_between_callbacks(tmpdir):
+    profiler = SamplingProfiler(str(tmpdir), interval=0.001, threshold=10.0)
+    profiler.begin()
+    profiler.end("quick", 0.0)
+    deadline = time.monotonic() + 2
+    while profiler._busy.is_set() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert not profiler._busy.is_set()
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import dash
+import pytest
+from dash import Input, Output, State, dcc, html
+from werkzeug.serving import make_server
+
+from dashboard.loadgen import CallbackGraph, build_payload, run_load
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+
+def _app():
+    app = dash.Dash(__name__)
+    app.layout = html.Div([
+        dcc.Input(id="aggregation", value="1h"),
+        html.Div(id="echo"),
+        html.Div(id="chained"),
+        html.Button(id="reset-button"),
+    ])
+
+    @app.callback(Output("echo", "children"), Input("aggregation", "value"))
+    def echo(value):
+        return value
+
+    @app.callback(Output("chained", "children"), Input("echo", "children"),
+                  Input("reset-button", "n_clicks"), State("aggregation", "value"))
+    def chained(value, clicks, aggregation):
+        return f"{value} {clicks} {aggregation}"
+
+    return app
+
+
+@pytest.fixture
+def server():
+    httpd = make_server("127.0.0.1", 0, _app().server, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_build_payload_uses_session_state():
+    dep = {"output": "chained.children",
+           "inputs": [{"id": "echo", "property": "children"},
+                      {"id": "reset-button", "property": "n_clicks"}],
+           "state": [{"id": "aggregation", "property": "value"}]}
+    graph = CallbackGraph([dep])
+    assert graph.triggered_by(["reset-button.n_clicks"]) == [dep]
+    assert graph.triggered_by(["aggregation.value"]) == []
+
+    state = {"echo": {"children": "1h"}, "reset-button": {"n_clicks": 2},
+             "aggregation": {"value": "1h"}}
+    payload = build_payload(dep, state, ["reset-button.n_clicks", "other.value"])
+    assert payload["outputs"] == {"id": "chained", "property": "children"}
+    assert [i["value"] for i in payload["inputs"]] == ["1h", 2]
+    assert payload["state"][0]["value"] == "1h"
+    assert payload["changedPropIds"] == ["reset-button.n_clicks"]
+
+
+def test_run_load_against_local_app(server):
+    summary = asyncio.run(run_load(server, users=3, duration=0.5, think_time=0.01,
+                                   seed=1))
+    assert set(summary["callbacks"]) == {"echo.children", "chained.children"}
+    assert summary["total"]["errors"] == 0
+    assert summary["total"]["requests"] > 6
+    assert summary["total"]["throughput"] > 0
+    assert summary["total"]["p99_ms"] >= summary["total"]["p50_ms"]
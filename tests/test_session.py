@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from plotly.io.json import to_json_plotly
+
+from dashboard.graph import CompactGraph
+from dashboard.loadgen import apply_patch
+from dashboard.session import FileSessionStore, MemorySessionStore, SessionState
+
+__author__ = "moghadas76"
+__copyright__ = "moghadas76"
+__license__ = "MIT"
+
+ELEMENTS = (
+    [{"data": {"id": str(i), "label": f"Node {i}"}} for i in range(1, 6)]
+    + [{"data": {"source": "1", "target": "2"}},
+       {"data": {"source": "2", "target": "3"}},
+       {"data": {"source": "4", "target": "5"}},
+       {"data": {"source": "5", "target": "9"}}]
+)
+
+
+def _apply(client, patch):
+    return apply_patch(client, json.loads(to_json_plotly(patch)))
+
+
+def _ids(elements):
+    return [e["data"].get("id") or f"{e['data']['source']}-{e['data']['target']}"
+            for e in elements]
+
+
+def test_graph_edits_send_patches_matching_server_state():
+    index = CompactGraph.from_elements(ELEMENTS)
+    state = SessionState(len(index))
+    client = list(ELEMENTS)
+
+    client = _apply(client, state.graph.remove(index, ["2"], state.graph.digest(index)))
+    assert _ids(client) == ["1", "3", "4", "5", "4-5", "5-9"]
+    assert client == state.graph.elements(index)
+
+    client = _apply(client, state.graph.keep(index, ["4", "5", "1"],
+                                             state.graph.digest(index)))
+    assert _ids(client) == ["1", "4", "5", "4-5"]
+    assert client == state.graph.elements(index)
+
+    client = _apply(client, state.graph.reset(index, state.graph.digest(index)))
+    assert client == ELEMENTS
+
+
+def test_out_of_date_clients_get_the_full_list():
+    index = CompactGraph.from_elements(ELEMENTS)
+    state = SessionState(len(index))
+    version = state.graph.digest(index)
+    # The client never got the answer to this edit
+    state.graph.remove(index, ["2"], version)
+    assert state.graph.remove(index, ["4"], version) == state.graph.elements(index)
+    assert state.graph.digest(index) != version
+    assert state.graph.reset(index, None) == ELEMENTS
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(maxsize=2)
+    first, second = store.create(3), store.create(3)
+    assert store.get(first) is not None
+    third = store.create(3)
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    assert len(store) == 2
+    store.forget(first)
+    assert store.get(first) is None
+
+
+def test_file_store_round_trip(tmpdir):
+    store = FileSessionStore(str(tmpdir))
+    key = store.create(len(ELEMENTS))
+    state = store.get(key)
+    state.graph.remove(CompactGraph.from_elements(ELEMENTS), ["1"], None)
+    state.filters["aggregation"] = "1h"
+    store.put(key, state)
+
+    loaded = FileSessionStore(str(tmpdir)).get(key)
+    assert loaded.filters == {"aggregation": "1h"}
+    assert not loaded.graph.shown[0]
+    assert store.get("missing") is None
+    assert store.get("../etc/passwd") is None
+
+
+def test_file_store_expires_and_caps_sessions(tmpdir):
+    store = FileSessionStore(str(tmpdir), max_age=60, maxsize=2, sweep_interval=3600)
+    keys = [store.create(3) for _ in range(3)]
+    for age, key in zip([30, 20, 10], keys):
+        path = store._path(key)
+        os.utime(path, (time.time() - age, time.time() - age))
+    store.sweep()
+    assert store.get(keys[0]) is None and len(store) == 2
+
+    os.utime(store._path(keys[1]), (time.time() - 120, time.time() - 120))
+    store.sweep()
+    assert store.get(keys[1]) is None and store.get(keys[2]) is not None
+
+    store.forget(keys[2])
+    assert store.get(keys[2]) is None and len(store) == 0
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_locked_updates_are_not_lost(tmpdir, shared):
+    stores = ([FileSessionStore(str(tmpdir)) for _ in range(2)] if shared
+              else [MemorySessionStore()] * 2)
+    key = stores[0].create(3)
+
+    def count(store, name):
+        for _ in range(50):
+            with store.lock(key):
+                state = store.get(key)
+                state.filters[name] = state.filters.get(name, 0) + 1
+                time.sleep(0)
+                store.put(key, state)
+
+    threads = [threading.Thread(target=count, args=(store, name))
+               for store in stores for name in ("sensors", "start")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert stores[1].get(key).filters == {"sensors": 100, "start": 100}
+    stores[0].forget(key)
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_large_edits_send_the_full_list():
+    index = CompactGraph.from_elements(ELEMENTS)
+    state = SessionState(len(index))
+    assert state.graph.keep(index, ["1"], state.graph.digest(index)) == [ELEMENTS[0]]
+    assert state.graph.reset(index, state.graph.digest(index)) == ELEMENTS